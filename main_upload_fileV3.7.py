@@ -1,6 +1,5 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
-import paramiko
 import os
 import posixpath
 import threading
@@ -9,6 +8,16 @@ import datetime
 import time
 import socket
 import stat
+import hashlib
+import queue
+import codecs
+import re
+import sys
+import select
+import struct
+import shlex
+import errno
+import inspect
 
 # --- 配色方案 ---
 COLORS = {
@@ -28,7 +37,69 @@ FONTS = {
     "main": ("Microsoft YaHei UI", 10), "bold": ("Microsoft YaHei UI", 10, "bold"),
     "code": ("Consolas", 10), "status": ("Microsoft YaHei UI", 12, "bold"), "cmd": ("Consolas", 11)
 }
+# paramiko/cryptography 导入较慢, 延迟到后台线程或首次连接时再加载, 窗口可立即显示
+paramiko = None
+
+def _load_paramiko():
+    global paramiko
+    if paramiko is None:
+        import paramiko as _paramiko
+        paramiko = _paramiko
+    return paramiko
+
 HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".sftp_uploader_history.json")
+QUEUE_FILE = os.path.join(os.path.expanduser("~"), ".sftp_uploader_queue.json")
+SNAPSHOT_DIR = os.path.join(os.path.expanduser("~"), ".sftp_uploader_snapshots")
+FULL_VERIFY_EVERY = 10  # 增量模式下每 N 次运行做一次完整校验 (对比远程)
+RELAY_CHUNK = 1024 * 1024  # 中转模式: 每个缓冲块大小 (内部拆成 32KB 请求流水线读取)
+RELAY_RING_SLOTS = 8       # 中转模式: 环形缓冲块数量, 内存上限约 RELAY_CHUNK * RELAY_RING_SLOTS
+RELAY_READER_JOIN = 60     # 中转模式: 单个文件结束后等待读线程退出的最长秒数
+SHELL_READ_CHUNK = 32768   # 终端: 每次从通道读取的字节数
+SHELL_MAX_PENDING = 65536  # 终端: 未换行输出超过该字符数时强制刷出
+SHELL_FLUSH_IDLE = 0.2     # 终端: 无新数据超过该秒数时刷出残余 (如提示符)
+TERM_MAX_LINES = 5000      # 终端: 显示区最多保留的行数
+TERM_QUEUE_SLOTS = 64      # 终端: 待显示输出块队列长度, 满时读取线程阻塞, 由 SSH 窗口反压远程命令
+TERM_DRAIN_MS = 50         # 终端: 界面线程取出待显示输出的周期 (毫秒)
+TERM_DRAIN_BATCH = 16      # 终端: 每个周期最多取出的输出块数, 避免界面卡顿
+PREWARM_MAX_AGE = 60       # 预连接: 握手结果超过该秒数未使用则丢弃 (避免服务端 LoginGraceTime 超时)
+DEDUP_MODES = {"关闭": "off", "硬链接 (ln -f)": "hardlink", "复制 (cp --reflink=auto)": "reflink", "符号链接 (symlink)": "symlink"}
+DEDUP_MIN_SIZE = 64 * 1024   # 去重: 小于该大小的文件直接上传 (不值得一次远程命令)
+DEDUP_HEAD_BYTES = 1024 * 1024  # 去重: 先比较文件头部摘要, 仍相同再计算全文摘要
+DEDUP_LINK_BATCH = 200       # 去重: 每条 exec_command 合并的链接命令数
+SPARSE_MIN_SIZE = 64 * 1024 * 1024  # 稀疏模式: 仅对不小于该大小的文件启用
+SPARSE_BLOCK = 64 * 1024   # 稀疏模式: 全零块检测粒度
+SPARSE_WINDOW = 1024 * 1024  # 稀疏模式: 每次读取的窗口大小
+ZERO_BLOCK = bytes(SPARSE_BLOCK)
+# 在远程用 SEEK_DATA/SEEK_HOLE 输出数据区段 "偏移 长度", 供稀疏下载使用;
+# 仅 ENXIO 表示其后再无数据, 其它错误 (文件系统不支持等) 以非零状态退出, 调用方退回整文件读取
+SPARSE_REMOTE_SCRIPT = (
+    "import os,sys,errno\n"
+    "fd=os.open(sys.argv[1],os.O_RDONLY);n=os.fstat(fd).st_size;o=0\n"
+    "while o<n:\n"
+    " try:d=os.lseek(fd,o,os.SEEK_DATA)\n"
+    " except OSError as e:\n"
+    "  if e.errno==errno.ENXIO:break\n"
+    "  sys.exit(2)\n"
+    " h=os.lseek(fd,d,os.SEEK_HOLE);print(d,min(h,n)-d);o=h\n"
+)
+PLAN_PROBE_BYTES = 2 * 1024 * 1024  # 传输计划: 测速时写入/读回的临时文件大小
+PLAN_CONFLICT_SLACK = 300  # 传输计划: 目标端 mtime 晚于上次传输超过该秒数才算被改动 (容忍两端时钟偏差)
+PLAN_VIEW_LIMIT = 2000     # 传输计划: 预览窗口最多显示的条目数 (导出 JSON 不受限)
+FANOUT_CHUNK = 256 * 1024  # 分发模式: 本地每次读取的块大小 (各目标共享同一缓冲)
+FANOUT_QUEUE_SLOTS = 16    # 分发模式: 每个目标的待写队列长度, 最慢目标最多落后 FANOUT_CHUNK * FANOUT_QUEUE_SLOTS
+FANOUT_STALL_TIMEOUT = 60  # 分发模式: 目标持续该秒数不消费队列/不返回目录列表, 视为卡死并标记失败
+WATCH_POLL_INTERVAL = 0.5  # 监听模式: 无 inotify 时轮询本地目录的间隔 (秒)
+WATCH_POLL_COST_RATIO = 20 # 监听模式: 轮询间隔至少为上次扫描耗时的该倍数, 大目录树自动放慢 (扫描占用 <= 5%)
+WATCH_POLL_MAX_INTERVAL = 30  # 监听模式: 自适应轮询间隔上限 (秒)
+WATCH_DEBOUNCE = 0.2       # 监听模式: 变更静默该秒数后作为一批推送
+WATCH_MAX_DELAY = 0.6      # 监听模式: 持续变更时, 一批最多累积的秒数
+TUNE_REQUEST_SIZE = 32768   # 自动调优: paramiko 单个 SFTP 读写请求大小, 在途字节 = 深度 * 该值
+TUNE_MIN_DEPTH = 16        # 自动调优: 下载预取在途请求数下限
+TUNE_MAX_DEPTH = 512       # 自动调优: 下载预取在途请求数上限
+TUNE_DEPTH_STEP = 16       # 自动调优: 每次加性增加的请求深度
+TUNE_MAX_STREAMS = 8       # 自动调优: 并行传输流 (独立 SFTP 通道) 上限
+TUNE_INTERVAL = 2.0        # 自动调优: 吞吐采样周期 (秒)
+ANSI_RE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]|\x1b\][^\x07]*\x07")
 
 class ModernButton(tk.Canvas):
     def __init__(self, parent, text, command=None, width=120, height=40, radius=20, bg_color=COLORS["accent"], hover_color=COLORS["accent_hover"], text_color="#000000"):
@@ -73,6 +144,157 @@ class ModernButton(tk.Canvas):
         self.hover_bg = hover
         if self.state == "normal": self.itemconfig(self.rect_id, fill=bg)
 
+class InotifyWatcher:
+    # Linux inotify (ctypes 直接调用 libc), 返回变更的相对路径集合; 事件队列溢出时返回 None
+    IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x8, 0x40, 0x80, 0x100, 0x200
+    IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR = 0x4000, 0x8000, 0x40000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, root):
+        import ctypes, ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0: raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root = root
+        self.wds = {}
+        self._add_tree("")
+
+    def _add_tree(self, rel):
+        for dirpath, dirs, files in os.walk(os.path.join(self.root, *rel.split("/")) if rel else self.root):
+            r = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.MASK)
+            if wd >= 0: self.wds[wd] = "" if r == "." else r
+
+    def _drop_tree(self, rel):
+        for wd, r in list(self.wds.items()):
+            if r == rel or r.startswith(rel + "/"):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.wds[wd]
+
+    def poll(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]: return set()
+        try: data = os.read(self.fd, 65536)
+        except BlockingIOError: return set()
+        changed, off = set(), 0
+        while off + 16 <= len(data):
+            wd, mask, cookie, ln = struct.unpack_from("iIII", data, off)
+            name = data[off + 16: off + 16 + ln].rstrip(b"\0")
+            off += 16 + ln
+            if mask & self.IN_Q_OVERFLOW: return None
+            if mask & self.IN_IGNORED: 
+                self.wds.pop(wd, None)
+                continue
+            base = self.wds.get(wd)
+            if base is None or not name: continue
+            rel = posixpath.join(base, os.fsdecode(name))
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO): self._add_tree(rel)
+                elif mask & (self.IN_DELETE | self.IN_MOVED_FROM): self._drop_tree(rel)
+            changed.add(rel)
+        return changed
+
+    def close(self):
+        try: os.close(self.fd)
+        except: pass
+
+class PollWatcher:
+    # 无 inotify 时的后备方案: 周期性对比本地清单 (只 stat, 不读文件内容, 不访问远程)
+    # 目录 mtime 未变时不重新列目录, 只 stat 已知文件; 间隔随扫描耗时自适应放慢
+    def __init__(self, app, root):
+        self.app, self.root = app, root
+        t0 = time.time()
+        self.dirs = app._scan_local_manifest(root)[0]
+        self.cost = time.time() - t0
+
+    def poll(self, timeout):
+        deadline = time.time() + min(WATCH_POLL_MAX_INTERVAL, max(timeout, self.cost * WATCH_POLL_COST_RATIO))
+        while self.app.is_running and time.time() < deadline: time.sleep(min(0.2, max(0, deadline - time.time())))
+        if not self.app.is_running: return set()
+        t0 = time.time()
+        dirs, new_dirs, changed = self.app._scan_local_manifest(self.root, self.dirs)
+        self.cost = time.time() - t0
+        if not self.app.is_running: return set()
+        found = set(new_dirs) | {rel for rel, _ in changed}
+        for rel, node in self.dirs.items():
+            if rel not in dirs: found.add(rel)
+            else: found.update(posixpath.join(rel, n) for n in node["files"] if n not in dirs[rel]["files"])
+        self.dirs = dirs
+        return found
+
+    def close(self): pass
+
+class TransferTuner:
+    # AIMD 控制器: 吞吐上升时并发流与请求深度加性增加, 吞吐明显回落时乘性减半
+    def __init__(self, streams, depth):
+        self.streams, self.depth = streams, depth
+        self.max_streams = TUNE_MAX_STREAMS
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.last_bytes, self.last_time, self.last_rate = 0, time.time(), 0.0
+        self.best = (0.0, streams, depth)  # 吞吐最高的采样周期所用参数, 任务结束后缓存
+
+    def add(self, n):
+        with self.lock: self.bytes += n
+
+    def sample(self):
+        now = time.time()
+        with self.lock: done = self.bytes
+        rate = (done - self.last_bytes) / max(now - self.last_time, 1e-3)
+        self.last_bytes, self.last_time = done, now
+        if rate > self.best[0]: self.best = (rate, self.streams, self.depth)
+        old = (self.streams, self.depth)
+        if rate > self.last_rate * 1.05:
+            self.streams = min(self.max_streams, self.streams + 1)
+            self.depth = min(TUNE_MAX_DEPTH, self.depth + TUNE_DEPTH_STEP)
+        elif rate < self.last_rate * 0.7:
+            self.streams = max(1, self.streams // 2)
+            self.depth = max(TUNE_MIN_DEPTH, self.depth // 2)
+        self.last_rate = rate
+        return rate, (self.streams, self.depth) != old
+
+class StreamPool:
+    # 多个 SFTP 通道并行传输文件; 序号 >= tuner.streams 的工作线程暂停取任务, 由 AIMD 控制实际并发数
+    # SFTPClient 不能跨线程共用, 每个工作线程独占一个新通道 (不使用主连接的 sftp_client); 打不开的通道直接放弃
+    def __init__(self, app, tuner):
+        self.app, self.tuner = app, tuner
+        self.closing = False
+        self.channels = []
+        for i in range(TUNE_MAX_STREAMS):
+            try: self.channels.append(app.ssh_client.open_sftp())
+            except Exception as e:
+                app.log(f"Auto-tune: opened {i} stream channel(s), more refused ({e})", "WARN")
+                break
+        if not self.channels: raise Exception("无法打开并行传输通道")
+        tuner.max_streams = len(self.channels)
+        tuner.streams = min(tuner.streams, tuner.max_streams)
+        tuner.best = (0.0, tuner.streams, tuner.depth)
+        self.q = queue.Queue(maxsize=len(self.channels) * 4)
+        self.threads = [threading.Thread(target=self._worker, args=(i, c), daemon=True) for i, c in enumerate(self.channels)]
+        for t in self.threads: t.start()
+
+    def submit(self, fn, *args):
+        self.q.put((fn, args))
+
+    def _worker(self, idx, sftp):
+        while True:
+            if idx >= self.tuner.streams:
+                if self.closing: break
+                time.sleep(0.2)
+                continue
+            try: fn, args = self.q.get(timeout=0.2)
+            except queue.Empty:
+                if self.closing: break
+                continue
+            try: fn(sftp, *args)
+            except Exception as e: self.app.log(f"Fail: {e}", "ERROR")
+
+    def close(self):
+        self.closing = True
+        for t in self.threads: t.join()
+        for c in self.channels:
+            try: c.close()
+            except: pass
+
 class SFTPUploaderApp:
     def __init__(self, root):
         self.root = root
@@ -83,6 +305,12 @@ class SFTPUploaderApp:
         self.use_jump = tk.BooleanVar(value=True)
         self.upload_mode = tk.StringVar(value="folder")
         self.force_overwrite = tk.BooleanVar(value=False)
+        self.incremental_mode = tk.BooleanVar(value=False)
+        self.prewarm_enabled = tk.BooleanVar(value=False)
+        self.watch_mode = tk.BooleanVar(value=False)
+        self.dedup_choice = tk.StringVar(value="关闭")
+        self.sparse_mode = tk.BooleanVar(value=False)
+        self.auto_tune = tk.BooleanVar(value=False)
         
         self.config_name = tk.StringVar()
         self.current_profile_name = tk.StringVar()
@@ -92,6 +320,10 @@ class SFTPUploaderApp:
         self.up_remote_path = tk.StringVar()
         self.down_remote_path = tk.StringVar()
         self.down_local_path = tk.StringVar()
+        self.relay_src_profile = tk.StringVar()
+        self.relay_src_path = tk.StringVar()
+        self.relay_dst_profile = tk.StringVar()
+        self.relay_dst_path = tk.StringVar()
         
         # --- 状态管理 ---
         self.is_running = False
@@ -99,6 +331,20 @@ class SFTPUploaderApp:
         self.ssh_client = None     
         self.sftp_client = None    
         self.jump_client = None    
+        self.shell_chan = None
+        self.shell_lock = threading.Lock()
+        self.term_queue = queue.Queue(maxsize=TERM_QUEUE_SLOTS)
+        self.prewarm = None
+        self.key_cache = {}   # (路径, mtime, 口令摘要) -> 解析后的 key (失败为 None)
+        self.key_types = {}   # (路径, mtime) -> 识别出的 key 类名
+        self.connected_label = None
+        self.job_queue = []
+        self.job_sessions = {}   # 配置名 -> (ssh, jump), 队列任务复用已认证的连接, 断开连接时关闭
+        self.job_jump_cache = {}
+        self.job_lock = threading.Lock()
+        self.queue_lock = threading.Lock()
+        self.job_tls = threading.local()
+        self.queue_concurrency = tk.StringVar(value="1")
         
         self.current_action = "upload"
         self.jump_inputs = {}
@@ -110,16 +356,28 @@ class SFTPUploaderApp:
         self.start_time = 0
         self.last_update_time = 0
         self.last_size = 0
+        self.incr_plan = None
+        self.approved_plan = None
+        self.failed_uploads = set()
+        self.dest_writes = 0     # 本次运行开始写入目标端的文件数, 决定是否记录传输时间
+        self.profile_sessions = []
+        self.fanout_targets = []
+        self.tuning = None       # 当前连接的链路探测结果与调优参数 (按配置缓存于历史记录)
+        self.tuner = None
+        self.stream_pool = None
 
         self._init_styles()
         self._init_ui()
+        self.root.after(TERM_DRAIN_MS, self._drain_term)
         
         self.history_records = self._load_history()
+        self._load_queue()
         self._update_combo()
         if self.history_records:
             self._apply_history(self.history_records[0])
         
         self.log(f"Config File: {HISTORY_FILE}", "INFO")
+        threading.Thread(target=self._background_init, daemon=True).start()
 
     def center_window(self, width, height):
         screen_width = self.root.winfo_screenwidth()
@@ -164,6 +422,7 @@ class SFTPUploaderApp:
         cb_frame = tk.Frame(jump_group, bg=COLORS["card"])
         cb_frame.grid(row=0, column=0, columnspan=3, sticky="w", pady=(0, 10))
         tk.Checkbutton(cb_frame, text="启用转发", variable=self.use_jump, command=self._toggle_jump, bg=COLORS["card"], fg=COLORS["accent"], selectcolor=COLORS["input_bg"], activebackground=COLORS["card"], activeforeground=COLORS["accent"], font=FONTS["main"]).pack(side="left")
+        tk.Checkbutton(cb_frame, text="启动时预连接 (Prewarm)", variable=self.prewarm_enabled, bg=COLORS["card"], fg=COLORS["text_dim"], selectcolor=COLORS["input_bg"], activebackground=COLORS["card"], activeforeground=COLORS["accent"], font=FONTS["main"]).pack(side="left", padx=10)
         self._add_input_row(jump_group, 1, "IP地址:", "jump_host", "")
         self._add_input_row(jump_group, 2, "用户名:", "jump_user", "")
         self._add_input_row(jump_group, 3, "密钥Key (可选):", "jump_key", "", is_file=True) 
@@ -196,8 +455,11 @@ class SFTPUploaderApp:
         mode_frame.grid(row=0, column=1, sticky="w", pady=5)
         tk.Radiobutton(mode_frame, text="上传文件夹", variable=self.upload_mode, value="folder", bg=COLORS["card"], fg=COLORS["text"], selectcolor=COLORS["input_bg"], activebackground=COLORS["card"]).pack(side="left", padx=5)
         tk.Radiobutton(mode_frame, text="上传单文件", variable=self.upload_mode, value="file", bg=COLORS["card"], fg=COLORS["text"], selectcolor=COLORS["input_bg"], activebackground=COLORS["card"]).pack(side="left", padx=5)
+        tk.Checkbutton(mode_frame, text="监听模式 (Watch: 持续同步变更)", variable=self.watch_mode, bg=COLORS["card"], fg=COLORS["text"], selectcolor=COLORS["input_bg"], activebackground=COLORS["card"]).pack(side="left", padx=15)
         self._add_input_row(up_frame, 1, "本地源路径:", "up_local", "", is_path=True, text_var=self.up_local_path)
         self._add_input_row(up_frame, 2, "远程目标目录:", "up_remote", "", text_var=self.up_remote_path)
+        tk.Label(up_frame, text="重复文件去重:", bg=COLORS["card"], fg=COLORS["text_dim"], font=FONTS["main"]).grid(row=3, column=0, sticky="e", padx=5, pady=8)
+        ttk.Combobox(up_frame, textvariable=self.dedup_choice, values=list(DEDUP_MODES), state="readonly", font=FONTS["main"]).grid(row=3, column=1, sticky="w", padx=5)
 
         self.tab_download = tk.Frame(self.action_notebook, bg=COLORS["bg"])
         self.action_notebook.add(self.tab_download, text=" 📥 下载 (Download) ")
@@ -206,6 +468,43 @@ class SFTPUploaderApp:
         self._add_input_row(down_frame, 1, "远程源路径:", "down_remote", "", text_var=self.down_remote_path)
         self._add_input_row(down_frame, 2, "本地保存目录:", "down_local", "", is_path=True, is_folder_only=True, text_var=self.down_local_path)
 
+        self.tab_relay = tk.Frame(self.action_notebook, bg=COLORS["bg"])
+        self.action_notebook.add(self.tab_relay, text=" 🔁 中转 (Relay) ")
+        relay_frame = self._create_group(self.tab_relay, "服务器间直传 (不落本地磁盘)")
+        tk.Label(relay_frame, text="源配置:", bg=COLORS["card"], fg=COLORS["text_dim"], font=FONTS["main"]).grid(row=0, column=0, sticky="e", padx=5, pady=8)
+        self.relay_src_combo = ttk.Combobox(relay_frame, textvariable=self.relay_src_profile, state="readonly", font=FONTS["main"])
+        self.relay_src_combo.grid(row=0, column=1, sticky="ew", padx=5)
+        self._add_input_row(relay_frame, 1, "源远程路径:", "relay_src", "", text_var=self.relay_src_path)
+        tk.Label(relay_frame, text="目标配置:", bg=COLORS["card"], fg=COLORS["text_dim"], font=FONTS["main"]).grid(row=2, column=0, sticky="e", padx=5, pady=8)
+        self.relay_dst_combo = ttk.Combobox(relay_frame, textvariable=self.relay_dst_profile, state="readonly", font=FONTS["main"])
+        self.relay_dst_combo.grid(row=2, column=1, sticky="ew", padx=5)
+        self._add_input_row(relay_frame, 3, "目标远程目录:", "relay_dst", "", text_var=self.relay_dst_path)
+
+        self.tab_fanout = tk.Frame(self.action_notebook, bg=COLORS["bg"])
+        self.action_notebook.add(self.tab_fanout, text=" 📡 分发 (Fan-out) ")
+        fanout_frame = self._create_group(self.tab_fanout, "一次读取, 同时上传到多个目标")
+        tk.Label(fanout_frame, text="提示: 使用「上传」页的本地源路径与远程目标目录，按住 Ctrl/Shift 多选配置。", bg=COLORS["card"], fg=COLORS["text_dim"]).grid(row=0, column=1, sticky="w")
+        tk.Label(fanout_frame, text="目标配置:", bg=COLORS["card"], fg=COLORS["text_dim"], font=FONTS["main"]).grid(row=1, column=0, sticky="ne", padx=5, pady=8)
+        self.fanout_list = tk.Listbox(fanout_frame, selectmode="extended", height=5, exportselection=False, bg=COLORS["input_bg"], fg="white", selectbackground=COLORS["accent"], selectforeground="black", relief="flat", borderwidth=0, font=FONTS["main"])
+        self.fanout_list.grid(row=1, column=1, sticky="ew", padx=5, pady=8)
+
+        self.tab_queue = tk.Frame(self.action_notebook, bg=COLORS["bg"])
+        self.action_notebook.add(self.tab_queue, text=" 🗂 队列 (Queue) ")
+        queue_frame = self._create_group(self.tab_queue, "任务队列 (使用当前配置与上传/下载页参数加入)")
+        self.queue_view = ttk.Treeview(queue_frame, columns=("id", "profile", "kind", "detail", "status"), show="headings", height=5)
+        for col, title, width in (("id", "#", 40), ("profile", "配置", 110), ("kind", "类型", 70), ("detail", "内容", 230), ("status", "状态", 140)):
+            self.queue_view.heading(col, text=title)
+            self.queue_view.column(col, width=width, anchor="w")
+        self.queue_view.grid(row=0, column=0, columnspan=3, sticky="ew", pady=(0, 5))
+        q_btns = tk.Frame(queue_frame, bg=COLORS["card"])
+        q_btns.grid(row=1, column=0, columnspan=3, sticky="w")
+        for text, kind in (("+ 上传", "upload"), ("+ 下载", "download"), ("+ 命令", "command")):
+            tk.Button(q_btns, text=text, command=lambda k=kind: self._enqueue_job(k), bg=COLORS["input_bg"], fg="white", bd=0, padx=8, cursor="hand2").pack(side="left", padx=3)
+        tk.Button(q_btns, text="删除选中", command=self._remove_selected_jobs, bg=COLORS["stop"], fg="white", bd=0, padx=8, cursor="hand2").pack(side="left", padx=3)
+        tk.Button(q_btns, text="清除已完成", command=self._clear_finished_jobs, bg=COLORS["input_bg"], fg="white", bd=0, padx=8, cursor="hand2").pack(side="left", padx=3)
+        tk.Label(q_btns, text="并发数:", bg=COLORS["card"], fg=COLORS["text_dim"], font=FONTS["main"]).pack(side="left", padx=(15, 3))
+        tk.Spinbox(q_btns, from_=1, to=8, width=3, textvariable=self.queue_concurrency, command=self._save_queue, bg=COLORS["input_bg"], fg="white", relief="flat").pack(side="left")
+
         # 4. 控制区
         ctrl_frame = tk.Frame(main_frame, bg=COLORS["bg"])
         ctrl_frame.pack(fill="x", pady=5)
@@ -229,6 +528,22 @@ class SFTPUploaderApp:
                                      selectcolor=COLORS["input_bg"], activebackground=COLORS["bg"], 
                                      activeforeground=COLORS["accent"], font=("Microsoft YaHei UI", 9))
         chk_overwrite.pack(side="right", padx=10)
+        chk_incr = tk.Checkbutton(status_frame, text="增量模式 (仅传变更)", variable=self.incremental_mode, 
+                                  bg=COLORS["bg"], fg=COLORS["text_dim"], 
+                                  selectcolor=COLORS["input_bg"], activebackground=COLORS["bg"], 
+                                  activeforeground=COLORS["accent"], font=("Microsoft YaHei UI", 9))
+        chk_incr.pack(side="right", padx=10)
+        chk_sparse = tk.Checkbutton(status_frame, text="稀疏文件优化", variable=self.sparse_mode, 
+                                    bg=COLORS["bg"], fg=COLORS["text_dim"], 
+                                    selectcolor=COLORS["input_bg"], activebackground=COLORS["bg"], 
+                                    activeforeground=COLORS["accent"], font=("Microsoft YaHei UI", 9))
+        chk_sparse.pack(side="right", padx=10)
+        chk_tune = tk.Checkbutton(status_frame, text="自动调优", variable=self.auto_tune, 
+                                  bg=COLORS["bg"], fg=COLORS["text_dim"], 
+                                  selectcolor=COLORS["input_bg"], activebackground=COLORS["bg"], 
+                                  activeforeground=COLORS["accent"], font=("Microsoft YaHei UI", 9))
+        chk_tune.pack(side="right", padx=10)
+        tk.Button(status_frame, text="📋 预览计划 (Dry-run)", command=self.start_plan, bg=COLORS["input_bg"], fg="white", font=("Microsoft YaHei UI", 9), bd=0, padx=8, cursor="hand2").pack(side="right", padx=10)
 
         # [进度标签]
         self.progress_label = tk.Label(ctrl_frame, text="READY", bg=COLORS["bg"], fg=COLORS["text_dim"], font=("Consolas", 10))
@@ -276,6 +591,7 @@ class SFTPUploaderApp:
         self.cmd_entry = tk.Entry(cmd_bar, textvariable=self.cmd_var, bg=COLORS["cmd_input_bg"], fg=COLORS["cmd_input_fg"], font=FONTS["cmd"], relief="flat", insertbackground="black")
         self.cmd_entry.pack(side="left", fill="x", expand=True, padx=5)
         self.cmd_entry.bind("<Return>", self.run_custom_command)
+        tk.Button(cmd_bar, text="中断 (Ctrl+C)", command=self.interrupt_command, bg=COLORS["stop"], fg="white", font=("Arial", 9, "bold"), bd=0, padx=10).pack(side="right", padx=(5, 0))
         tk.Button(cmd_bar, text="发送指令", command=self.run_custom_command, bg=COLORS["accent"], fg="black", font=("Arial", 9, "bold"), bd=0, padx=10).pack(side="right")
 
         self._toggle_jump()
@@ -321,10 +637,22 @@ class SFTPUploaderApp:
             self.current_action = "upload"
             self.btn_start.set_text("▶ 开始上传")
             self.btn_start.set_color(COLORS["accent"], COLORS["accent_hover"])
-        else:
+        elif tab_id == 1:
             self.current_action = "download"
             self.btn_start.set_text("▼ 开始下载")
             self.btn_start.set_color(COLORS["download"], COLORS["download_hover"])
+        elif tab_id == 2:
+            self.current_action = "relay"
+            self.btn_start.set_text("⇄ 开始中转")
+            self.btn_start.set_color(COLORS["connect"], COLORS["connect_hover"])
+        elif tab_id == 3:
+            self.current_action = "fanout"
+            self.btn_start.set_text("📡 开始分发")
+            self.btn_start.set_color(COLORS["accent"], COLORS["accent_hover"])
+        else:
+            self.current_action = "queue"
+            self.btn_start.set_text("▶ 运行队列")
+            self.btn_start.set_color(COLORS["save"], COLORS["save_hover"])
 
     # --- 逻辑 ---
     def _load_history(self):
@@ -340,26 +668,40 @@ class SFTPUploaderApp:
         self._save_history()
         messagebox.showinfo("保存", "配置已成功保存！")
 
+    def _current_label(self):
+        t = {k: v.get() for k, v in self.target_inputs.items()}
+        return self.config_name.get().strip() or f"{t['target_user']}@{t['target_host']}"
+
     def _save_history(self):
         j = {k: v.get() for k, v in self.jump_inputs.items()}
         t = {k: v.get() for k, v in self.target_inputs.items()}
-        label = self.config_name.get().strip() or f"{t['target_user']}@{t['target_host']}"
+        label = self._current_label()
         data = {
             "label": label, "config_name": self.config_name.get(), "upload_mode": self.upload_mode.get(), "use_jump": self.use_jump.get(), 
+            "incremental": self.incremental_mode.get(), "prewarm": self.prewarm_enabled.get(), "watch": self.watch_mode.get(),
+            "dedup": self.dedup_choice.get(), "sparse": self.sparse_mode.get(), "auto_tune": self.auto_tune.get(),
             "up_local": self.up_local_path.get(), "up_remote": self.up_remote_path.get(),
             "down_local": self.down_local_path.get(), "down_remote": self.down_remote_path.get(),
             "jump_config": j, "target_config": t
         }
+        old = self._find_profile(label)
+        if old and "tuning" in old: data["tuning"] = old["tuning"]
         self.history_records = [r for r in self.history_records if r['label'] != label]
         self.history_records.insert(0, data)
         try: 
-            with open(HISTORY_FILE, "w", encoding="utf-8") as f: 
-                json.dump(self.history_records[:10], f, indent=4)
+            self._write_history()
             self._update_combo()
             self.history_combo.current(0)
         except: 
             pass
 
+    def _write_history(self):
+        # 只保留最近 10 个配置, 但仍被未完成队列任务引用的配置不淘汰, 否则重启后任务找不到配置
+        refs = {j["profile"] for j in self.job_queue if j["status"] != "done"}
+        keep = self.history_records[:10] + [r for r in self.history_records[10:] if r["label"] in refs]
+        with open(HISTORY_FILE, "w", encoding="utf-8") as f: 
+            json.dump(keep, f, indent=4)
+
     def _clear_history_handler(self):
         if not self.history_records: return
         if not messagebox.askyesno("确认清空", "⚠️ 确定要清空所有记录吗？"): return
@@ -373,12 +715,25 @@ class SFTPUploaderApp:
         self.log("History cleared.", "WARN")
 
     def _update_combo(self): 
-        self.history_combo['values'] = [r['label'] for r in self.history_records]
+        labels = [r['label'] for r in self.history_records]
+        self.history_combo['values'] = labels
+        self.relay_src_combo['values'] = labels
+        self.relay_dst_combo['values'] = labels
+        self.fanout_list.delete(0, tk.END)
+        for label in labels: self.fanout_list.insert(tk.END, label)
         if not self.history_records: self.history_combo.set("")
 
+    def _find_profile(self, label):
+        for r in self.history_records:
+            if r['label'] == label: return r
+        return None
+
     def _on_history_select(self, e):
         idx = self.history_combo.current()
-        if idx >= 0: self._apply_history(self.history_records[idx])
+        if idx >= 0: 
+            self._apply_history(self.history_records[idx])
+            if self.prewarm_enabled.get() and not self.is_connected:
+                threading.Thread(target=self._start_prewarm, daemon=True).start()
 
     def _apply_history(self, r):
         self.use_jump.set(r.get("use_jump", True))
@@ -387,6 +742,12 @@ class SFTPUploaderApp:
         self.down_local_path.set(r.get("down_local", ""))
         self.down_remote_path.set(r.get("down_remote", ""))
         self.upload_mode.set(r.get("upload_mode", "folder"))
+        self.incremental_mode.set(r.get("incremental", False))
+        self.prewarm_enabled.set(r.get("prewarm", False))
+        self.watch_mode.set(r.get("watch", False))
+        self.dedup_choice.set(r.get("dedup", "关闭"))
+        self.sparse_mode.set(r.get("sparse", False))
+        self.auto_tune.set(r.get("auto_tune", False))
         self.config_name.set(r.get("config_name", ""))
         for k, v in r.get("jump_config", {}).items():
             if k in self.jump_inputs: 
@@ -448,13 +809,14 @@ class SFTPUploaderApp:
         return result["value"] if result["value"] is not None else ""
 
     # --- 🔒 MFA Handler (核心分流逻辑) ---
-    def mfa_interactive_handler(self, title, instructions, prompt_list):
+    def mfa_interactive_handler(self, title, instructions, prompt_list, creds=None):
         self.log(f"--- 🔒 Interactive Auth Required ---", "MFA")
         resp = []
         
-        # 获取两个框的内容
-        gui_static_pwd = self.target_inputs["target_static_pwd"].get().strip()
-        gui_pin = self.target_inputs["target_pass"].get().strip()
+        # 获取两个框的内容 (指定配置时使用配置中保存的值)
+        if creds is None: creds = {k: v.get() for k, v in self.target_inputs.items()}
+        gui_static_pwd = (creds.get("target_static_pwd") or "").strip()
+        gui_pin = (creds.get("target_pass") or "").strip()
         
         for i, (prompt, echo) in enumerate(prompt_list):
             self.log(f"Server asks: {prompt.strip()}", "INFO")
@@ -498,24 +860,87 @@ class SFTPUploaderApp:
 
     # --- 连接核心逻辑 ---
     def _try_load_key(self, key_path, password):
+        _load_paramiko()
+        try: mtime = os.stat(key_path).st_mtime_ns
+        except: return None
+        # 同一文件 (路径+mtime) 只解析一次; 已识别类型时优先尝试该类型
+        cache_key = (key_path, mtime, hashlib.sha256((password or "").encode("utf-8")).hexdigest())
+        if cache_key in self.key_cache: return self.key_cache[cache_key]
         key_classes = []
         if hasattr(paramiko, "RSAKey"): key_classes.append(paramiko.RSAKey)
         if hasattr(paramiko, "Ed25519Key"): key_classes.append(paramiko.Ed25519Key)
         if hasattr(paramiko, "ECDSAKey"): key_classes.append(paramiko.ECDSAKey)
         if hasattr(paramiko, "DSSKey"): key_classes.append(paramiko.DSSKey)
+        known = self.key_types.get((key_path, mtime))
+        if known: key_classes.sort(key=lambda c: c.__name__ != known)
+        pkey = None
         for k_cls in key_classes:
-            try: return k_cls.from_private_key_file(key_path, password=password or None)
+            try: 
+                pkey = k_cls.from_private_key_file(key_path, password=password or None)
+                self.key_types[(key_path, mtime)] = k_cls.__name__
+                break
             except: continue
+        self.key_cache[cache_key] = pkey
+        return pkey
+
+    # --- 启动加速: 后台导入 & 预连接 ---
+    def _background_init(self):
+        try: _load_paramiko()
+        except Exception as e: 
+            self.log(f"paramiko import failed: {e}", "ERROR")
+            return
+        if self.prewarm_enabled.get() and not self.is_connected: self._start_prewarm()
+
+    def _start_prewarm(self):
+        # 用户仍在查看表单时, 提前完成首跳 (跳板机或直连目标) 的 TCP 连接与密钥交换
+        j = {k: v.get() for k, v in self.jump_inputs.items()}
+        t = {k: v.get() for k, v in self.target_inputs.items()}
+        if self.use_jump.get(): h, p = j['jump_host'], j['jump_port']
+        else: h, p = t['target_host'], t['target_port']
+        if not h: return
+        # superseded: 被新的预连接替换或连接时未被采用; 只有这种情况才关闭 (被连接线程取走的不能关)
+        pw = {"addr": (h, str(p)), "time": time.time(), "done": threading.Event(), "transport": None, "superseded": False}
+        old, self.prewarm = self.prewarm, pw
+        if old:
+            old["superseded"] = True
+            if old["transport"]: old["transport"].close()
+        try:
+            _load_paramiko()
+            tr = paramiko.Transport(socket.create_connection((h, int(p)), timeout=60))
+            tr.start_client(timeout=60)
+            pw["transport"] = tr
+            if pw["superseded"]: tr.close()
+            else: self.log(f"Prewarmed handshake with {h}.", "INFO")
+        except Exception as e:
+            self.log(f"Prewarm skipped: {e}", "WARN")
+        finally:
+            pw["done"].set()
+
+    def _take_prewarmed(self, h, p):
+        pw, self.prewarm = self.prewarm, None
+        if not pw: return None
+        if pw["addr"] == (h, str(p)) and time.time() - pw["time"] < PREWARM_MAX_AGE:
+            pw["done"].wait(60)
+            tr = pw["transport"]
+            if tr and tr.is_active() and not tr.is_authenticated(): 
+                self.log(f"Using prewarmed handshake for {h}.", "INFO")
+                return tr
+        # 未采用: 握手仍在进行时由预连接线程完成后自行关闭
+        pw["superseded"] = True
+        if pw["transport"]: pw["transport"].close()
         return None
 
-    def _connect_node_generic(self, h, p, u, k, pwd, sock=None):
-        if sock:
-            transport = paramiko.Transport(sock)
-        else:
-            sock_raw = socket.create_connection((h, int(p)), timeout=60)
-            transport = paramiko.Transport(sock_raw)
-        
-        transport.start_client(timeout=60)
+    def _connect_node_generic(self, h, p, u, k, pwd, sock=None, handler=None):
+        _load_paramiko()
+        transport = None if sock else self._take_prewarmed(h, p)
+        if transport is None:
+            if sock:
+                transport = paramiko.Transport(sock)
+            else:
+                sock_raw = socket.create_connection((h, int(p)), timeout=60)
+                transport = paramiko.Transport(sock_raw)
+            
+            transport.start_client(timeout=60)
         k = os.path.expanduser(k)
         auth_success = False
 
@@ -541,7 +966,7 @@ class SFTPUploaderApp:
         # 这里会触发 mfa_interactive_handler，里面会根据 Prompt 智能选择填密码还是PIN
         if not transport.is_authenticated():
             try: 
-                transport.auth_interactive(u, self.mfa_interactive_handler)
+                transport.auth_interactive(u, handler or self.mfa_interactive_handler)
                 auth_success = True
             except Exception as e: 
                 pass
@@ -555,23 +980,38 @@ class SFTPUploaderApp:
         client._transport = transport 
         return client
 
-    def _get_ssh_connection(self):
-        t = {k: v.get() for k, v in self.target_inputs.items()}
-        j = {k: v.get() for k, v in self.jump_inputs.items()}
+    def _get_ssh_connection(self, profile=None, jump_cache=None):
+        if profile:
+            # 使用历史配置连接 (中转等多会话场景), 缺失字段按界面默认值补齐
+            t = {**{k: "" for k in self.target_inputs}, "target_port": "22", **profile.get("target_config", {})}
+            j = {**{k: "" for k in self.jump_inputs}, "jump_port": "22", **profile.get("jump_config", {})}
+            use_jump = profile.get("use_jump", True)
+        else:
+            t = {k: v.get() for k, v in self.target_inputs.items()}
+            j = {k: v.get() for k, v in self.jump_inputs.items()}
+            use_jump = self.use_jump.get()
+        handler = lambda title, instructions, prompt_list: self.mfa_interactive_handler(title, instructions, prompt_list, t)
         jc = None
-        if self.use_jump.get():
+        if use_jump:
             if not j['jump_host']: raise Exception("Jump Host IP missing")
-            self.log(f"Connecting to Jump Host: {j['jump_host']}...", "INFO")
-            jc = self._connect_node_generic(j['jump_host'], j['jump_port'], j['jump_user'], j['jump_key'], j['jump_pass'])
+            # 多个目标共用同一跳板机时复用已认证的跳板机会话, 只新开隧道通道
+            jump_key = (j['jump_host'], str(j['jump_port']), j['jump_user'])
+            jc = jump_cache.get(jump_key) if jump_cache is not None else None
+            if jc and jc.get_transport() and jc.get_transport().is_active():
+                self.log(f"Reusing Jump Host session: {j['jump_host']}", "INFO")
+            else:
+                self.log(f"Connecting to Jump Host: {j['jump_host']}...", "INFO")
+                jc = self._connect_node_generic(j['jump_host'], j['jump_port'], j['jump_user'], j['jump_key'], j['jump_pass'], handler=handler)
+                if jump_cache is not None: jump_cache[jump_key] = jc
             sock = jc.get_transport().open_channel("direct-tcpip", (t['target_host'], int(t['target_port'])), (j['jump_host'], 0))
             self.log("Tunnel established. Connecting to Target...", "INFO")
             # [关键] 这里传入 target_static_pwd 作为默认密码尝试
-            tc = self._connect_node_generic(t['target_host'], t['target_port'], t['target_user'], t['target_key'], t.get('target_static_pwd'), sock=sock)
+            tc = self._connect_node_generic(t['target_host'], t['target_port'], t['target_user'], t['target_key'], t.get('target_static_pwd'), sock=sock, handler=handler)
         else:
             if not t['target_host']: raise Exception("Target Host IP missing")
             self.log(f"Direct connection to {t['target_host']}...", "INFO")
             # [关键] 这里传入 target_static_pwd 作为默认密码尝试
-            tc = self._connect_node_generic(t['target_host'], t['target_port'], t['target_user'], t['target_key'], t.get('target_static_pwd'))
+            tc = self._connect_node_generic(t['target_host'], t['target_port'], t['target_user'], t['target_key'], t.get('target_static_pwd'), handler=handler)
         return tc, jc
 
     # --- 持久化连接管理 ---
@@ -585,12 +1025,14 @@ class SFTPUploaderApp:
         try:
             self.ssh_client, self.jump_client = self._get_ssh_connection()
             self.sftp_client = self.ssh_client.open_sftp()
+            self.connected_label = self._current_label()
             
             # 保持连接活跃
             self.ssh_client.get_transport().set_keepalive(30)
             
             self.log("Connection Established & Ready.", "SUCCESS")
             self.root.after(0, lambda: self._set_connected_ui(True))
+            if self.auto_tune.get(): self._probe_link()
         except Exception as e:
             self.log(f"Connection Failed: {e}", "ERROR")
             self.root.after(0, lambda: self._set_connected_ui(False))
@@ -603,6 +1045,9 @@ class SFTPUploaderApp:
         self.log("Session Closed.", "INFO")
 
     def _close_all_sessions(self):
+        try:
+            if self.shell_chan: self.shell_chan.close()
+        except: pass
         try:
             if self.sftp_client: self.sftp_client.close()
         except: pass
@@ -615,18 +1060,64 @@ class SFTPUploaderApp:
         self.sftp_client = None
         self.ssh_client = None
         self.jump_client = None
+        self.shell_chan = None
+        self.connected_label = None
+        self.tuning = None
+        for c, j in self.job_sessions.values():
+            try: c.close()
+            except: pass
+        for j in self.job_jump_cache.values():
+            try: j.close()
+            except: pass
+        self.job_sessions = {}
+        self.job_jump_cache = {}
+
+    def _open_profile_session(self, label, jump_cache=None):
+        r = self._find_profile(label)
+        if not r: raise Exception(f"配置不存在: {label}")
+        self.log(f">>> Opening session for profile [{label}]...", "CMD")
+        c, j = self._get_ssh_connection(r, jump_cache)
+        self.profile_sessions.append((c, j))
+        c.get_transport().set_keepalive(30)
+        return c.open_sftp()
+
+    def _close_profile_sessions(self):
+        for c, j in self.profile_sessions:
+            try: c.close()
+            except: pass
+            try: 
+                if j: j.close()
+            except: pass
+        self.profile_sessions = []
 
     # --- 任务执行 ---
-    def start_thread(self):
-        if self.current_action == "upload" and not self.up_local_path.get(): 
+    def start_thread(self, plan=None):
+        if self.is_running: return
+        # 执行已确认的计划: 路径与文件列表均取自计划, 不重新扫描
+        # 计划自带方向, 不修改当前标签页状态 (预览窗口打开期间用户可能已切换标签页)
+        action = plan["action"] if plan else self.current_action
+        if not plan and action == "upload" and not self.up_local_path.get(): 
             return messagebox.showerror("Error", "请选择本地源路径")
-        if self.current_action == "download" and not self.down_remote_path.get(): 
+        if not plan and action == "download" and not self.down_remote_path.get(): 
             return messagebox.showerror("Error", "请填写远程源路径")
+        if action == "relay":
+            if not self.relay_src_profile.get() or not self.relay_dst_profile.get():
+                return messagebox.showerror("Error", "请选择源配置和目标配置")
+            if not self.relay_src_path.get() or not self.relay_dst_path.get():
+                return messagebox.showerror("Error", "请填写源远程路径和目标远程目录")
         
-        # 必须先连接
-        if not self.is_connected or not self.sftp_client:
+        if action == "fanout":
+            if not self.up_local_path.get(): return messagebox.showerror("Error", "请在「上传」页选择本地源路径")
+            if not self.fanout_list.curselection(): return messagebox.showerror("Error", "请至少选择一个目标配置")
+        if action == "queue" and not any(j["status"] == "pending" for j in self.job_queue):
+            return messagebox.showerror("Error", "队列中没有待执行的任务")
+        
+        # 必须先连接 (中转/分发模式按所选配置各自建立会话)
+        if action not in ("relay", "fanout", "queue") and (not self.is_connected or not self.sftp_client):
             return messagebox.showerror("Error", "请先点击 [🔗 连接服务器]")
         
+        self.approved_plan = plan
+        self.dest_writes = 0
         self.is_running = True
         self.btn_start.set_state("disabled")
         self.btn_stop.set_state("normal")
@@ -639,8 +1130,8 @@ class SFTPUploaderApp:
         self.last_update_time = self.start_time
         self.last_size = 0
         
-        self.log(f">>> Start {self.current_action.upper()}", "CMD")
-        threading.Thread(target=self.run_process, daemon=True).start()
+        self.log(f">>> Start {action.upper()}", "CMD")
+        threading.Thread(target=self.run_process, args=(action,), daemon=True).start()
 
     def stop_task(self):
         if self.is_running:
@@ -679,17 +1170,37 @@ class SFTPUploaderApp:
         except: pass
         return total
 
-    def run_process(self):
+    def run_process(self, action):
+        relay_src = relay_dst = None
         try:
-            try:
-                self.sftp_client.listdir('.')
-            except:
-                raise Exception("连接已断开，请重新点击 [连接服务器]")
+            if action == "relay":
+                relay_src = self._open_profile_session(self.relay_src_profile.get())
+                relay_dst = self._open_profile_session(self.relay_dst_profile.get())
+            elif action == "fanout":
+                self.fanout_targets = self._open_fanout_targets([self.fanout_list.get(i) for i in self.fanout_list.curselection()])
+            elif action != "queue":
+                try:
+                    self.sftp_client.listdir('.')
+                except:
+                    raise Exception("连接已断开，请重新点击 [连接服务器]")
 
             self.log("正在计算任务总大小... (Computing total size)", "INFO")
             
-            if self.current_action == "upload":
+            if self.approved_plan:
+                self.total_task_size = self.approved_plan["bytes"]
+            elif action == "fanout":
                 self.total_task_size = self._get_recursive_local_size(self.up_local_path.get())
+            elif action == "queue":
+                self.total_task_size = self._prepare_queue()
+            elif action == "upload":
+                self.incr_plan = None
+                if self.upload_mode.get() == "folder" and (self.incremental_mode.get() or self._dedup_mode() != "off"):
+                    self.incr_plan = self._build_incremental_plan(self.up_local_path.get(), self.up_remote_path.get())
+                    self.total_task_size = self.incr_plan["bytes"]
+                else:
+                    self.total_task_size = self._get_recursive_local_size(self.up_local_path.get())
+            elif action == "relay":
+                self.total_task_size = self._get_recursive_remote_size(relay_src, self.relay_src_path.get())
             else:
                 self.log("提示：远程文件夹大小计算较慢，请稍候...", "WARN")
                 self.total_task_size = self._get_recursive_remote_size(self.sftp_client, self.down_remote_path.get())
@@ -699,10 +1210,28 @@ class SFTPUploaderApp:
             self.root.after(0, lambda: self.progress_bar.configure(maximum=self.total_task_size))
             self.log(f"Total Size: {self.total_task_size / 1048576:.2f} MB", "INFO")
 
-            if self.current_action == "upload": 
-                self.do_upload(self.sftp_client)
+            if self.approved_plan:
+                self._execute_plan(self.sftp_client, self.approved_plan)
+            elif action == "upload": 
+                # 监听模式: 首次上传前先建立监听, 上传期间发生的改动缓存在监听器中, 作为第一批推送
+                watcher = self._make_watcher(self.up_local_path.get()) if self.watch_mode.get() and self.upload_mode.get() == "folder" else None
+                try:
+                    self._start_streams()
+                    try: self.do_upload(self.sftp_client)
+                    finally: self._finish_streams()
+                    if self.watch_mode.get() and self.is_running: self.do_watch(self.sftp_client, watcher)
+                finally:
+                    if watcher: watcher.close()
+            elif action == "relay":
+                self.do_relay(relay_src, relay_dst)
+            elif action == "fanout":
+                self.do_fanout(self.fanout_targets)
+            elif action == "queue":
+                self.do_queue()
             else: 
-                self.do_download(self.sftp_client)
+                self._start_streams()
+                try: self.do_download(self.sftp_client)
+                finally: self._finish_streams()
                 
             if self.is_running: 
                 self.log("TASK COMPLETE.", "SUCCESS")
@@ -727,6 +1256,10 @@ class SFTPUploaderApp:
                  self.root.after(0, lambda: self._set_connected_ui(False))
             messagebox.showerror("Error", str(e))
         finally:
+            if self.profile_sessions: self._close_profile_sessions()
+            # 本次确实写过目标端 (含中断残留) 才记录传输时间; 未写入就中止的运行不能掩盖此前他人对目标端的改动
+            if action in ("upload", "download") and self.dest_writes: self._save_snapshot(self._sync_mark_path(action), {"time": time.time()})
+            self.approved_plan = None
             self.is_running = False
             self.btn_start.set_state("normal")
             self.btn_stop.set_state("disabled")
@@ -763,7 +1296,8 @@ class SFTPUploaderApp:
         if self.upload_mode.get() == "folder":
             base = os.path.basename(os.path.normpath(lp))
             rp = posixpath.join(rb, base)
-            self.upload_r(sftp, lp, rp)
+            if self.incr_plan: self._upload_incremental(sftp, lp, rp, self.incr_plan)
+            else: self.upload_r(sftp, lp, rp)
         else:
             rp = posixpath.join(rb, os.path.basename(lp))
             self.upload_f(sftp, lp, rp)
@@ -782,16 +1316,17 @@ class SFTPUploaderApp:
             l = os.path.join(local, item)
             r = posixpath.join(remote, item)
             if os.path.isdir(l): self.upload_r(sftp, l, r)
-            else: self.upload_f(sftp, l, r)
+            else: self._dispatch(self.upload_f, sftp, l, r)
 
-    def upload_f(self, sftp, local, remote):
-        if not self.is_running: return
+    def upload_f(self, sftp, local, remote, check_remote=True):
+        if not self.is_running: return False
         fname = os.path.basename(local)
         
         size = os.path.getsize(local)
         need = True
         
-        if not self.force_overwrite.get():
+        attr = None
+        if check_remote and not self.force_overwrite.get():
             try:
                 attr = sftp.stat(remote)
                 if attr.st_size == size: 
@@ -802,19 +1337,237 @@ class SFTPUploaderApp:
         
         if need:
             self.log(f"Uploading: {fname}", "CMD")
-            self._current_file_prev_transferred = 0
+            self.dest_writes += 1
+            prev = [0]
+            # 先写到同目录临时文件再改名覆盖: 远程可能是去重生成的硬链接/符号链接 (SFTP 无法识别硬链接),
+            # 改名只替换目录项, 不会改写共享的数据; 上传失败时原文件保持完整
+            tmp = posixpath.join(posixpath.dirname(remote), f".{posixpath.basename(remote)}.{os.getpid()}.part")
             
             def detailed_cb(transferred, total):
                 if not self.is_running: raise Exception("Stop")
-                chunk = transferred - self._current_file_prev_transferred
-                self._current_file_prev_transferred = transferred
+                chunk = transferred - prev[0]
+                prev[0] = transferred
+                if self.tuner: self.tuner.add(chunk)
                 self.root.after(0, lambda: self.update_status(fname, chunk))
             
             try: 
-                sftp.put(local, remote, callback=detailed_cb)
+                if self.sparse_mode.get() and size >= SPARSE_MIN_SIZE: self._put_sparse(sftp, local, tmp, size, fname)
+                else: sftp.put(local, tmp, callback=detailed_cb)
+                # 沿用原文件的权限位
+                if attr is None:
+                    try: attr = sftp.stat(remote)
+                    except: pass
+                if attr is not None and attr.st_mode is not None: sftp.chmod(tmp, stat.S_IMODE(attr.st_mode))
+                try: sftp.posix_rename(tmp, remote)
+                except IOError:
+                    # 服务端不支持 posix-rename 扩展时退回 删除 + rename
+                    try: sftp.remove(remote)
+                    except: pass
+                    sftp.rename(tmp, remote)
                 self.log(f"OK: {fname}", "SUCCESS")
+                self._count_job("files")
             except Exception as e: 
-                if "Stop" not in str(e): self.log(f"Fail: {e}", "ERROR")
+                try: sftp.remove(tmp)
+                except: pass
+                if "Stop" not in str(e): 
+                    self.log(f"Fail: {e}", "ERROR")
+                    self._count_job("failed")
+                return False
+        return True
+
+    # --- 增量同步 (本地快照) ---
+    def _snapshot_path(self, local, remote_base):
+        key = f"{self._current_label()}|{os.path.abspath(local)}|{remote_base}"
+        return os.path.join(SNAPSHOT_DIR, hashlib.md5(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _load_snapshot(self, path):
+        if os.path.exists(path):
+            try: 
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except: 
+                pass
+        return None
+
+    def _save_snapshot(self, path, data):
+        try:
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            self.log(f"Snapshot save failed: {e}", "WARN")
+
+    def _scan_local_manifest(self, root, prev_dirs=None, trust_dir_mtime=True):
+        # 目录 mtime 与快照一致 => 目录项未增删, 省去 scandir, 但仍逐个 stat 已知文件 (内容修改不会改变目录 mtime)
+        # 返回 (dirs, new_dirs, changed); changed 为 [(相对路径, 大小)]
+        prev_dirs = prev_dirs or {}
+        dirs, new_dirs, changed = {}, [], []
+        stack = [""]
+        while stack:
+            if not self.is_running: break
+            rel = stack.pop()
+            full = os.path.join(root, *rel.split("/")) if rel else root
+            try: mtime = os.stat(full).st_mtime_ns
+            except: continue
+            prev = prev_dirs.get(rel)
+            if prev is None: new_dirs.append(rel)
+            if trust_dir_mtime and prev and prev["mtime"] == mtime:
+                node = {"mtime": mtime, "subdirs": prev["subdirs"], "files": {}}
+                for name in prev["files"]:
+                    try: st = os.stat(os.path.join(full, name))
+                    except: continue
+                    node["files"][name] = [st.st_size, st.st_mtime_ns, st.st_ino]
+            else:
+                node = {"mtime": mtime, "subdirs": [], "files": {}}
+                try:
+                    with os.scandir(full) as it:
+                        for e in it:
+                            try:
+                                if e.is_dir(): node["subdirs"].append(e.name)
+                                else:
+                                    st = e.stat()
+                                    node["files"][e.name] = [st.st_size, st.st_mtime_ns, st.st_ino]
+                            except: pass
+                except: pass
+            old_files = prev["files"] if prev else {}
+            for name, meta in node["files"].items():
+                if old_files.get(name) != meta: changed.append((posixpath.join(rel, name), meta[0]))
+            dirs[rel] = node
+            stack.extend(posixpath.join(rel, d) for d in node["subdirs"])
+        return dirs, new_dirs, changed
+
+    def _build_incremental_plan(self, local, remote_base):
+        # 未开启增量模式时 (仅去重) 不读写快照, 等同于一次完整校验
+        path, snap, runs = None, None, 0
+        if self.incremental_mode.get():
+            path = self._snapshot_path(local, remote_base)
+            snap = self._load_snapshot(path)
+            runs = snap.get("runs", 0) if snap else 0
+        full = snap is None or runs % FULL_VERIFY_EVERY == 0
+        if full and path: self.log("增量模式: 本次执行完整校验 (Full verify)", "WARN")
+        dirs, new_dirs, changed = self._scan_local_manifest(local, None if full else snap.get("dirs"))
+        if path: self.log(f"Incremental: {len(changed)} changed file(s), {len(new_dirs)} new dir(s)", "INFO")
+        dups = self._find_duplicates(local, dirs, changed) if self._dedup_mode() != "off" else {}
+        return {"path": path, "runs": runs, "full": full, "dirs": dirs, "new_dirs": new_dirs,
+                "changed": changed, "dups": dups, "bytes": sum(sz for rel, sz in changed if rel not in dups)}
+
+    def _upload_incremental(self, sftp, local, remote, plan, ssh=None):
+        self.failed_uploads = set()
+        for rel in sorted(plan["new_dirs"]):
+            if not self.is_running: return
+            r = posixpath.join(remote, rel) if rel else remote
+            try: sftp.mkdir(r)
+            except: 
+                if not rel:
+                    try: 
+                        sftp.mkdir(posixpath.dirname(r))
+                        sftp.mkdir(r)
+                    except: pass
+        # 完整校验时才对比远程大小, 平时直接传输变更文件
+        dups = plan["dups"]
+        sizes = dict(plan["changed"])
+        for rel, _ in plan["changed"]:
+            if not self.is_running: return
+            if rel in dups: continue
+            l = os.path.join(local, *rel.split("/"))
+            if not self.upload_f(sftp, l, posixpath.join(remote, rel), check_remote=plan["full"]):
+                self.failed_uploads.add(rel)
+        if dups and self.is_running:
+            # 源文件上传失败的重复文件改为正常上传
+            pairs = [(d, c) for d, c in sorted(dups.items()) if c not in self.failed_uploads]
+            fallback = [d for d, c in dups.items() if c in self.failed_uploads]
+            failed_links = self._link_duplicates(sftp, remote, pairs, ssh)
+            saved = sum(sizes[d] for d, c in pairs if d not in failed_links)
+            self.log(f"Dedup: {len(pairs) - len(failed_links)} duplicate(s) linked on server, saved {saved / 1048576:.2f} MB", "SUCCESS")
+            for rel in sorted(fallback + failed_links):
+                if not self.is_running: return
+                l = os.path.join(local, *rel.split("/"))
+                if not self.upload_f(sftp, l, posixpath.join(remote, rel), check_remote=False):
+                    self.failed_uploads.add(rel)
+        if self.is_running and plan["path"]: self._commit_snapshot(local, plan)
+
+    # --- 重复文件去重 (Dedup) ---
+    def _dedup_mode(self):
+        return DEDUP_MODES.get(self.dedup_choice.get(), "off")
+
+    def _hash_file(self, path, limit=None):
+        h = hashlib.sha256()
+        remaining = limit
+        with open(path, "rb") as f:
+            while remaining is None or remaining > 0:
+                buf = f.read(1048576 if remaining is None else min(1048576, remaining))
+                if not buf: break
+                h.update(buf)
+                if remaining is not None: remaining -= len(buf)
+        return h.hexdigest()
+
+    def _group_by_hash(self, local, rels, limit=None):
+        groups = {}
+        for rel in rels:
+            if not self.is_running: break
+            try: digest = self._hash_file(os.path.join(local, *rel.split("/")), limit)
+            except: continue
+            groups.setdefault(digest, []).append(rel)
+        return groups
+
+    def _find_duplicates(self, local, dirs, changed):
+        # 按大小分组, 再用头部摘要 + 全文摘要确认; 返回 {重复文件: 源文件} (均为相对路径)
+        changed_set = {rel for rel, _ in changed}
+        by_size = {}
+        for drel, node in dirs.items():
+            for name, meta in node["files"].items():
+                if meta[0] >= DEDUP_MIN_SIZE: by_size.setdefault(meta[0], []).append(posixpath.join(drel, name))
+        dups = {}
+        for size, rels in by_size.items():
+            if len(rels) < 2 or not any(r in changed_set for r in rels): continue
+            for head in self._group_by_hash(local, rels, DEDUP_HEAD_BYTES).values():
+                if len(head) < 2: continue
+                groups = self._group_by_hash(local, head).values() if size > DEDUP_HEAD_BYTES else [head]
+                for same in groups:
+                    if len(same) < 2 or not any(r in changed_set for r in same): continue
+                    # 优先以未变更 (远程已存在) 的文件为源
+                    same.sort(key=lambda r: (r in changed_set, r))
+                    for r in same[1:]:
+                        if r in changed_set: dups[r] = same[0]
+        if dups: self.log(f"Dedup: found {len(dups)} duplicate file(s)", "INFO")
+        return dups
+
+    def _link_duplicates(self, sftp, remote, pairs, ssh=None):
+        # 在服务器端由已上传的源文件生成重复文件, 返回失败的相对路径列表; ssh 默认为当前持久连接
+        ssh = ssh or self.ssh_client
+        mode = self._dedup_mode()
+        failed = []
+        if mode == "symlink":
+            for dup, canon in pairs:
+                if not self.is_running: break
+                r = posixpath.join(remote, dup)
+                try: sftp.remove(r)
+                except: pass
+                try: sftp.symlink(posixpath.relpath(posixpath.join(remote, canon), posixpath.dirname(r)), r)
+                except: failed.append(dup)
+            return failed
+        tmpl = "ln -f -- {} {}" if mode == "hardlink" else "cp --reflink=auto -f -- {} {}"
+        for i in range(0, len(pairs), DEDUP_LINK_BATCH):
+            if not self.is_running: break
+            batch = pairs[i:i + DEDUP_LINK_BATCH]
+            cmd = "\n".join(tmpl.format(shlex.quote(posixpath.join(remote, c)), shlex.quote(posixpath.join(remote, d))) + " || echo " + shlex.quote("FAIL " + d) for d, c in batch)
+            try:
+                stdin, stdout, stderr = ssh.exec_command(cmd)
+                out = stdout.read().decode("utf-8", "replace")
+                failed += [line[5:] for line in out.splitlines() if line.startswith("FAIL ")]
+            except Exception as e:
+                self.log(f"Dedup link failed: {e}", "ERROR")
+                failed += [d for d, c in batch]
+        return failed
+
+    def _commit_snapshot(self, local, plan):
+        dirs = plan["dirs"]
+        # 失败文件所在目录不入快照, 下次运行会重新扫描并重传
+        for rel in self.failed_uploads: dirs.pop(posixpath.dirname(rel), None)
+        self._save_snapshot(plan["path"], {"local": os.path.abspath(local), "runs": plan["runs"] + 1, "dirs": dirs})
+        self.log(f"Snapshot saved ({len(dirs)} dirs).", "INFO")
 
     def do_download(self, sftp):
         rp = self.down_remote_path.get()
@@ -831,22 +1584,22 @@ class SFTPUploaderApp:
             local_file = os.path.join(ld, posixpath.basename(rp))
             self.download_f(sftp, rp, local_file, r_stat.st_size)
 
-    def download_r(self, sftp, remote_dir, local_dir):
+    def download_r(self, sftp, remote_dir, local_dir, ssh=None):
         if not self.is_running: return
         if not os.path.exists(local_dir): os.makedirs(local_dir)
         for entry in sftp.listdir_attr(remote_dir):
             if not self.is_running: break
             r_path = posixpath.join(remote_dir, entry.filename)
             l_path = os.path.join(local_dir, entry.filename)
-            if stat.S_ISDIR(entry.st_mode): self.download_r(sftp, r_path, l_path)
-            else: self.download_f(sftp, r_path, l_path, entry.st_size)
+            if stat.S_ISDIR(entry.st_mode): self.download_r(sftp, r_path, l_path, ssh)
+            else: self._dispatch(self.download_f, sftp, r_path, l_path, entry.st_size, True, ssh)
 
-    def download_f(self, sftp, remote_file, local_file, size):
+    def download_f(self, sftp, remote_file, local_file, size, check_local=True, ssh=None):
         if not self.is_running: return
         fname = os.path.basename(remote_file)
         need = True
         
-        if not self.force_overwrite.get():
+        if check_local and not self.force_overwrite.get():
             if os.path.exists(local_file) and os.path.getsize(local_file) == size:
                 self.log(f"Skip: {fname}", "INFO")
                 self.root.after(0, lambda: self.update_status(fname, size))
@@ -854,19 +1607,919 @@ class SFTPUploaderApp:
             
         if need:
             self.log(f"Downloading: {fname}", "CMD")
+            self.dest_writes += 1
             
-            self._current_file_prev_transferred = 0
+            prev = [0]
             def detailed_cb(transferred, total):
                 if not self.is_running: raise Exception("Stop")
-                chunk = transferred - self._current_file_prev_transferred
-                self._current_file_prev_transferred = transferred
+                chunk = transferred - prev[0]
+                prev[0] = transferred
+                if self.tuner: self.tuner.add(chunk)
                 self.root.after(0, lambda: self.update_status(fname, chunk))
                 
             try: 
-                sftp.get(remote_file, local_file, callback=detailed_cb)
+                if self.sparse_mode.get() and size >= SPARSE_MIN_SIZE: self._get_sparse(sftp, remote_file, local_file, size, fname, ssh)
+                else: sftp.get(remote_file, local_file, callback=detailed_cb, **self._get_kwargs())
                 self.log(f"OK: {fname}", "SUCCESS")
+                self._count_job("files")
             except Exception as e:
-                if "Stop" not in str(e): self.log(f"Fail: {e}", "ERROR")
+                if "Stop" not in str(e): 
+                    self.log(f"Fail: {e}", "ERROR")
+                    self._count_job("failed")
+
+    # --- 链路探测与自动调优 ---
+    def _probe_link(self):
+        # 连接后测量 RTT 与吞吐, 按带宽时延积估算初始参数; 该配置有上次调优结果时以其为起点
+        link, err = None, None
+        for d in (self.up_remote_path.get(), "."):
+            try:
+                link = self._measure_link(self.sftp_client, d)
+                break
+            except Exception as e: err = e
+        if not link: return self.log(f"Link probe failed ({err}), auto-tune disabled.", "WARN")
+        bdp = max(link["up"], link["down"]) * link["rtt"]
+        depth = min(TUNE_MAX_DEPTH, max(TUNE_MIN_DEPTH, int(bdp * 2 / TUNE_REQUEST_SIZE)))
+        streams = 1 if link["rtt"] < 0.02 else 2 if link["rtt"] < 0.1 else 4
+        cached = (self._find_profile(self.connected_label) or {}).get("tuning")
+        if cached: streams, depth = cached.get("streams", streams), cached.get("depth", depth)
+        self.tuning = dict(link, streams=streams, depth=depth)
+        self.log(f"Link: RTT {link['rtt'] * 1000:.0f} ms, up {link['up'] / 1048576:.1f} MB/s, down {link['down'] / 1048576:.1f} MB/s "
+                 f"-> streams {streams}, depth {depth}{' (cached)' if cached else ''}", "INFO")
+
+    def _start_streams(self):
+        if not (self.auto_tune.get() and self.tuning): return
+        tuner = TransferTuner(self.tuning["streams"], self.tuning["depth"])
+        try: self.stream_pool = StreamPool(self, tuner)
+        except Exception as e: return self.log(f"Auto-tune disabled for this task: {e}", "WARN")
+        self.tuner = tuner
+        threading.Thread(target=self._tune_loop, args=(self.tuner,), daemon=True).start()
+
+    def _tune_loop(self, tuner):
+        while True:
+            time.sleep(TUNE_INTERVAL)
+            if self.tuner is not tuner or not self.is_running: break
+            rate, changed = tuner.sample()
+            if changed: self.log(f"Auto-tune: {rate / 1048576:.1f} MB/s -> streams {tuner.streams}, depth {tuner.depth}", "INFO")
+
+    def _finish_streams(self):
+        # 等待并行流传完, 把吞吐最高时的参数缓存到当前配置, 下次连接直接作为起点
+        pool, tuner = self.stream_pool, self.tuner
+        if not pool: return
+        pool.close()
+        self.stream_pool = self.tuner = None
+        # 任务中途断开连接时 tuning 已被清空, 不再缓存
+        if not self.tuning: return
+        self.tuning.update(streams=tuner.best[1], depth=tuner.best[2])
+        r = self._find_profile(self.connected_label)
+        if r:
+            r["tuning"] = self.tuning
+            try: self._write_history()
+            except: pass
+
+    def _dispatch(self, fn, sftp, *args):
+        # 自动调优时交给并行流 (各自的 SFTP 通道) 执行, 否则在当前通道上直接传输
+        if self.stream_pool: self.stream_pool.submit(fn, *args)
+        else: fn(sftp, *args)
+
+    def _get_kwargs(self):
+        # paramiko >= 3.3 才支持限制下载预取的在途请求数
+        if self.tuner and "max_concurrent_prefetch_requests" in inspect.signature(paramiko.SFTPClient.get).parameters:
+            return {"max_concurrent_prefetch_requests": self.tuner.depth}
+        return {}
+
+    # --- 任务队列 (Queue) ---
+    def _load_queue(self):
+        if os.path.exists(QUEUE_FILE):
+            try: 
+                with open(QUEUE_FILE, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.job_queue = data.get("jobs", [])
+                self.queue_concurrency.set(str(data.get("concurrency", 1)))
+            except: 
+                pass
+        # 上次退出时未完成的任务重新排队
+        for job in self.job_queue:
+            if job["status"] == "running": job["status"] = "pending"
+        self._refresh_queue_view()
+
+    def _save_queue(self):
+        with self.queue_lock:
+            try: 
+                with open(QUEUE_FILE, "w", encoding="utf-8") as f:
+                    json.dump({"concurrency": self._queue_concurrency(), "jobs": self.job_queue}, f, ensure_ascii=False, indent=4)
+            except: 
+                pass
+
+    def _queue_concurrency(self):
+        try: return max(1, min(8, int(self.queue_concurrency.get())))
+        except: return 1
+
+    def _refresh_queue_view(self):
+        self.queue_view.delete(*self.queue_view.get_children())
+        for job in self.job_queue:
+            if job["kind"] == "command": detail = job["cmd"]
+            elif job["kind"] == "upload": detail = f"{job['local']} -> {job['remote']}"
+            else: detail = f"{job['remote']} -> {job['local']}"
+            status = job["status"] + (f" ({job['result']})" if job.get("result") else "")
+            self.queue_view.insert("", tk.END, iid=str(job["id"]), values=(job["id"], job["profile"], job["kind"], detail, status))
+
+    def _enqueue_job(self, kind):
+        # 校验通过后以当前表单保存/更新配置, 任务只记录配置名, 运行时按配置建立会话
+        job = {"id": max([j["id"] for j in self.job_queue] + [0]) + 1, "profile": self._current_label(), "kind": kind, "status": "pending", "result": ""}
+        if kind == "upload":
+            if not self.up_local_path.get(): return messagebox.showerror("Error", "请选择本地源路径")
+            job.update(local=self.up_local_path.get(), remote=self.up_remote_path.get(), mode=self.upload_mode.get())
+        elif kind == "download":
+            if not self.down_remote_path.get(): return messagebox.showerror("Error", "请填写远程源路径")
+            job.update(local=self.down_local_path.get(), remote=self.down_remote_path.get())
+        else:
+            cmd = simpledialog.askstring("加入命令", "远程命令:", parent=self.root)
+            if not cmd or not cmd.strip(): return
+            job["cmd"] = cmd.strip()
+        self._save_history()
+        self.job_queue.append(job)
+        self._save_queue()
+        self._refresh_queue_view()
+        self.log(f"Queued job #{job['id']}: {kind} @ {job['profile']}", "INFO")
+
+    def _remove_selected_jobs(self):
+        if self.is_running: return messagebox.showerror("Error", "队列运行中, 无法删除")
+        ids = {int(i) for i in self.queue_view.selection()}
+        self.job_queue = [j for j in self.job_queue if j["id"] not in ids]
+        self._save_queue()
+        self._refresh_queue_view()
+
+    def _clear_finished_jobs(self):
+        if self.is_running: return messagebox.showerror("Error", "队列运行中, 无法清除")
+        self.job_queue = [j for j in self.job_queue if j["status"] not in ("done", "failed")]
+        self._save_queue()
+        self._refresh_queue_view()
+
+    def _count_job(self, key):
+        stats = getattr(self.job_tls, "stats", None)
+        if stats is not None: stats[key] += 1
+
+    def _job_session(self, label):
+        # 复用已认证的连接 (transport): 与当前持久连接同一配置时直接使用, 否则每个配置只登录一次;
+        # SFTPClient 不能跨线程共用, 由调用方在该连接上为每个任务单独 open_sftp()
+        with self.job_lock:
+            if self.is_connected and self.ssh_client and label == self.connected_label: return self.ssh_client
+            sess = self.job_sessions.get(label)
+            if sess and sess[0].get_transport() and sess[0].get_transport().is_active(): return sess[0]
+            r = self._find_profile(label)
+            if not r: raise Exception(f"配置不存在: {label}")
+            self.log(f">>> Opening session for profile [{label}]...", "CMD")
+            c, j = self._get_ssh_connection(r, self.job_jump_cache)
+            c.get_transport().set_keepalive(30)
+            self.job_sessions[label] = (c, j)
+            return c
+
+    def _prepare_queue(self):
+        # 运行前先为所有配置登录 (MFA 提示集中在开始时), 并统计总大小
+        total = 0
+        for job in self.job_queue:
+            if not self.is_running: break
+            if job["status"] != "pending": continue
+            try:
+                ssh = self._job_session(job["profile"])
+                if job["kind"] == "upload": total += self._get_recursive_local_size(job["local"])
+                elif job["kind"] == "download":
+                    sftp = ssh.open_sftp()
+                    try: total += self._get_recursive_remote_size(sftp, job["remote"])
+                    finally: sftp.close()
+            except Exception as e:
+                self.log(f"[Job #{job['id']}] {e}", "ERROR")
+        return total
+
+    def do_queue(self):
+        jobs = [j for j in self.job_queue if j["status"] == "pending"]
+        todo = queue.Queue()
+        for job in jobs: todo.put(job)
+        n = min(self._queue_concurrency(), len(jobs))
+        self.log(f"Running {len(jobs)} job(s), concurrency {n}...", "INFO")
+        def worker():
+            while self.is_running:
+                try: job = todo.get_nowait()
+                except queue.Empty: return
+                self._run_job(job)
+        workers = [threading.Thread(target=worker, daemon=True) for _ in range(n)]
+        for w in workers: w.start()
+        for w in workers: w.join()
+        done = sum(1 for j in jobs if j["status"] == "done")
+        self.log(f"Queue finished: {done}/{len(jobs)} job(s) succeeded.", "SUCCESS" if done == len(jobs) else "WARN")
+
+    def _update_job(self, job, status, result=""):
+        job["status"], job["result"] = status, result
+        self._save_queue()
+        self.root.after(0, self._refresh_queue_view)
+
+    def _run_job(self, job):
+        tag = f"[Job #{job['id']}]"
+        self._update_job(job, "running")
+        self.log(f"{tag} Start {job['kind']} @ {job['profile']}", "CMD")
+        self.job_tls.stats = stats = {"files": 0, "failed": 0}
+        sftp = None
+        try:
+            ssh = self._job_session(job["profile"])
+            if job["kind"] in ("upload", "download"): sftp = ssh.open_sftp()
+            if job["kind"] == "upload":
+                lp, rb = job["local"], job["remote"]
+                if job.get("mode", "folder") == "folder": self.upload_r(sftp, lp, posixpath.join(rb, os.path.basename(os.path.normpath(lp))))
+                else: self.upload_f(sftp, lp, posixpath.join(rb, os.path.basename(lp)))
+                result = f"{stats['files']} 传输, {stats['failed']} 失败"
+            elif job["kind"] == "download":
+                rp, ld = job["remote"], job["local"]
+                try: r_stat = sftp.stat(rp)
+                except: raise Exception("远程路径不存在")
+                if stat.S_ISDIR(r_stat.st_mode): self.download_r(sftp, rp, os.path.join(ld, posixpath.basename(rp.rstrip('/'))), ssh)
+                else: self.download_f(sftp, rp, os.path.join(ld, posixpath.basename(rp)), r_stat.st_size, ssh=ssh)
+                result = f"{stats['files']} 传输, {stats['failed']} 失败"
+            else:
+                chan = ssh.get_transport().open_session()
+                chan.exec_command(job["cmd"])
+                self._pump_channel(chan)
+                code = chan.recv_exit_status()
+                if code: stats["failed"] += 1
+                result = f"exit {code}"
+            if not self.is_running: self._update_job(job, "pending", "已中止, 下次继续")
+            else: self._update_job(job, "done" if not stats["failed"] else "failed", result)
+            self.log(f"{tag} {job['status']}: {job['result']}", "SUCCESS" if job["status"] == "done" else "WARN")
+        except Exception as e:
+            self._update_job(job, "failed", str(e)[:60])
+            self.log(f"{tag} Failed: {e}", "ERROR")
+        finally:
+            self.job_tls.stats = None
+            if sftp:
+                try: sftp.close()
+                except: pass
+
+    # --- 稀疏文件传输 (Sparse) ---
+    def _local_extents(self, path, size):
+        # 用 SEEK_DATA/SEEK_HOLE 找出本地数据区段; 系统/文件系统不支持时视为整个文件都是数据
+        if not hasattr(os, "SEEK_DATA"): return [(0, size)]
+        extents, off = [], 0
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            while off < size:
+                try: data = os.lseek(fd, off, os.SEEK_DATA)
+                except OSError as e:
+                    if e.errno == errno.ENXIO: break
+                    return [(0, size)]
+                hole = os.lseek(fd, data, os.SEEK_HOLE)
+                extents.append((data, min(hole, size) - data))
+                off = hole
+        finally:
+            os.close(fd)
+        return extents
+
+    def _remote_extents(self, ssh, path, size):
+        # 通过 exec_command 在 sftp 所属的服务器上获取数据区段, 拿不到时返回 None (退回整文件读取)
+        try:
+            cmd = f"python3 -c {shlex.quote(SPARSE_REMOTE_SCRIPT)} {shlex.quote(path)}"
+            stdin, stdout, stderr = ssh.exec_command(cmd)
+            out = stdout.read().decode("utf-8", "replace")
+            if stdout.channel.recv_exit_status() != 0: return None
+            extents = [tuple(int(x) for x in line.split()) for line in out.splitlines() if line.strip()]
+            if all(len(e) == 2 and 0 <= e[0] and e[0] + e[1] <= size for e in extents): return extents
+        except: pass
+        return None
+
+    def _data_runs(self, buf, base):
+        # 按 SPARSE_BLOCK 切分缓冲, 合并相邻的非全零块, 返回 [(偏移, 数据)]
+        runs, start = [], None
+        mv = memoryview(buf)
+        for i in range(0, len(buf), SPARSE_BLOCK):
+            blk = mv[i:i + SPARSE_BLOCK]
+            zero = blk == ZERO_BLOCK if len(blk) == SPARSE_BLOCK else not any(blk)
+            if zero and start is not None:
+                runs.append((base + start, bytes(mv[start:i])))
+                start = None
+            elif not zero and start is None: start = i
+        if start is not None: runs.append((base + start, bytes(mv[start:])))
+        return runs
+
+    def _put_sparse(self, sftp, local, remote, size, fname):
+        extents = self._local_extents(local, size)
+        data_bytes = sum(n for _, n in extents)
+        self.log(f"Sparse: {fname} data {data_bytes / 1048576:.1f} / {size / 1048576:.1f} MB", "INFO")
+        # 空洞部分直接计入进度
+        if size > data_bytes: self.root.after(0, lambda: self.update_status(fname, size - data_bytes))
+        with open(local, "rb") as lf, sftp.open(remote, "wb") as rf:
+            rf.set_pipelined(True)
+            for start, length in extents:
+                off, end = start, start + length
+                while off < end:
+                    if not self.is_running: raise Exception("Stop")
+                    lf.seek(off)
+                    buf = lf.read(min(SPARSE_WINDOW, end - off))
+                    if not buf: break
+                    for run_off, run in self._data_runs(buf, off):
+                        rf.seek(run_off)
+                        rf.write(run)
+                    off += len(buf)
+                    if self.tuner: self.tuner.add(len(buf))
+                    self.root.after(0, lambda n=len(buf): self.update_status(fname, n))
+            rf.truncate(size)
+
+    def _get_sparse(self, sftp, remote, local, size, fname, ssh=None):
+        extents = self._remote_extents(ssh or self.ssh_client, remote, size)
+        if extents is None:
+            self.log(f"Sparse: remote extent map unavailable for {fname}, reading whole file.", "WARN")
+            extents = [(0, size)]
+        else:
+            data_bytes = sum(n for _, n in extents)
+            self.log(f"Sparse: {fname} data {data_bytes / 1048576:.1f} / {size / 1048576:.1f} MB", "INFO")
+            if size > data_bytes: self.root.after(0, lambda: self.update_status(fname, size - data_bytes))
+        with sftp.open(remote, "rb") as rf, open(local, "wb") as lf:
+            for start, length in extents:
+                off, end = start, start + length
+                while off < end:
+                    if not self.is_running: raise Exception("Stop")
+                    n = min(SPARSE_WINDOW, end - off)
+                    buf = b"".join(rf.readv([(off, n)]))
+                    for run_off, run in self._data_runs(buf, off):
+                        lf.seek(run_off)
+                        lf.write(run)
+                    off += n
+                    if self.tuner: self.tuner.add(n)
+                    self.root.after(0, lambda n=n: self.update_status(fname, n))
+            # 未写入的尾部/空洞由 truncate 补足长度, 本地文件系统保持稀疏
+            lf.truncate(size)
+
+    # --- 传输计划 (Dry-run) ---
+    def start_plan(self):
+        if self.is_running: return
+        if not self.is_connected or not self.sftp_client:
+            return messagebox.showerror("Error", "请先点击 [🔗 连接服务器]")
+        if self.current_action not in ("upload", "download"):
+            return messagebox.showerror("Error", "传输计划仅支持上传/下载")
+        if self.current_action == "upload" and not self.up_local_path.get(): 
+            return messagebox.showerror("Error", "请选择本地源路径")
+        if self.current_action == "download" and not self.down_remote_path.get(): 
+            return messagebox.showerror("Error", "请填写远程源路径")
+        self.is_running = True
+        self.btn_start.set_state("disabled")
+        self.btn_stop.set_state("normal")
+        self.log(f">>> Planning {self.current_action.upper()} (dry-run, no data transferred)", "CMD")
+        threading.Thread(target=self._plan_thread, daemon=True).start()
+
+    def _plan_thread(self):
+        try:
+            sftp = self.sftp_client
+            if self.current_action == "upload": plan = self._build_upload_plan(sftp)
+            else: plan = self._build_download_plan(sftp)
+            if not self.is_running: return self.log("Planning Aborted.", "WARN")
+            self._estimate_plan(sftp, plan)
+            counts = {op: sum(1 for it in plan["items"] if it["op"] == op) for op in ("new", "changed", "skip", "conflict")}
+            self.log(f"Plan: {counts['new']} new, {counts['changed']} changed, {counts['skip']} skipped, {counts['conflict']} conflict(s), "
+                     f"{plan['bytes'] / 1048576:.2f} MB, ETA {self._fmt_eta(plan['eta_sec'])}", "SUCCESS")
+            self.root.after(0, lambda: self._show_plan(plan, counts))
+        except Exception as e:
+            self.log(f"Plan Error: {e}", "ERROR")
+        finally:
+            self.is_running = False
+            self.btn_start.set_state("normal")
+            self.btn_stop.set_state("disabled")
+
+    def _plan_item(self, plan, op, rel, size, other_size=None):
+        plan["items"].append({"op": op, "rel": rel, "size": size, "other_size": other_size})
+        if op in ("new", "changed"): plan["bytes"] += size
+
+    def _classify(self, size, mtime, other, synced=None):
+        # other 为目标端已有文件的 (大小, mtime); put/get 不保留 mtime, 传过的目标端总比源端"新",
+        # 因此只有目标端在上次传输 (synced) 之后又被改动才视为冲突, 其余大小不同 (如中断残留) 均为变更
+        if other is None: return "new"
+        if self.force_overwrite.get(): return "changed"
+        if other[0] == size: return "skip"
+        if synced is not None and other[1] > max(mtime, synced) + PLAN_CONFLICT_SLACK: return "conflict"
+        return "changed"
+
+    def _sync_mark_path(self, action):
+        # 记录该配置下该方向 (本地, 远程) 最后一次传输的时间, 与增量快照放在同一目录
+        a, b = (self.up_local_path.get(), self.up_remote_path.get()) if action == "upload" else (self.down_remote_path.get(), self.down_local_path.get())
+        key = f"sync|{self._current_label()}|{action}|{a}|{b}"
+        return os.path.join(SNAPSHOT_DIR, hashlib.md5(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _last_synced(self, action):
+        return (self._load_snapshot(self._sync_mark_path(action)) or {}).get("time")
+
+    def _build_upload_plan(self, sftp):
+        lp = self.up_local_path.get()
+        rb = self.up_remote_path.get()
+        if self.upload_mode.get() == "folder":
+            local, remote = lp, posixpath.join(rb, os.path.basename(os.path.normpath(lp)))
+            dirs = self._scan_local_manifest(local)[0]
+        else:
+            local, remote = os.path.dirname(lp), rb
+            st = os.stat(lp)
+            dirs = {"": {"mtime": 0, "subdirs": [], "files": {os.path.basename(lp): [st.st_size, st.st_mtime_ns, st.st_ino]}}}
+        plan = {"action": "upload", "local": local, "remote": remote, "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "dirs": [], "items": [], "bytes": 0}
+        missing = set()  # 远程不存在的目录: 其下全部为新文件, 不再列目录
+        synced = self._last_synced("upload")
+        for rel in sorted(dirs):
+            if not self.is_running: break
+            node = dirs[rel]
+            r = posixpath.join(remote, rel) if rel else remote
+            entries = {}
+            if rel and posixpath.dirname(rel) in missing: missing.add(rel)
+            else:
+                # 每个目录一次 listdir_attr 批量获取远程元数据, 不逐个 stat
+                try: entries = {e.filename: e for e in sftp.listdir_attr(r)}
+                except IOError: missing.add(rel)
+            if rel in missing and self.upload_mode.get() == "folder": plan["dirs"].append(rel)
+            for name, meta in sorted(node["files"].items()):
+                e = entries.get(name)
+                frel = posixpath.join(rel, name)
+                if e is not None and stat.S_ISDIR(e.st_mode): self._plan_item(plan, "conflict", frel, meta[0])
+                else: self._plan_item(plan, self._classify(meta[0], meta[1] / 1e9, e and (e.st_size, e.st_mtime), synced), frel, meta[0], e and e.st_size)
+            for sub in node["subdirs"]:
+                e = entries.get(sub)
+                if e is not None and not stat.S_ISDIR(e.st_mode):
+                    self._plan_item(plan, "conflict", posixpath.join(rel, sub), 0)
+                    missing.add(posixpath.join(rel, sub))
+        # 与远程文件冲突的目录不创建, 其下文件也不传
+        conflicts = {it["rel"] for it in plan["items"] if it["op"] == "conflict"}
+        plan["dirs"] = [d for d in plan["dirs"] if not any(d == c or d.startswith(c + "/") for c in conflicts)]
+        plan["items"] = [it for it in plan["items"] if it["op"] == "conflict" or not any(it["rel"].startswith(c + "/") for c in conflicts)]
+        plan["bytes"] = sum(it["size"] for it in plan["items"] if it["op"] in ("new", "changed"))
+        return plan
+
+    def _build_download_plan(self, sftp):
+        rp = self.down_remote_path.get()
+        ld = self.down_local_path.get()
+        try: r_stat = sftp.stat(rp)
+        except: raise Exception("远程路径不存在")
+        plan = {"action": "download", "created": datetime.datetime.now().isoformat(timespec="seconds"), "dirs": [], "items": [], "bytes": 0}
+        synced = self._last_synced("download")
+        if not stat.S_ISDIR(r_stat.st_mode):
+            plan["remote"], plan["local"] = posixpath.dirname(rp), ld
+            name = posixpath.basename(rp)
+            self._plan_item(plan, self._classify(r_stat.st_size, r_stat.st_mtime, self._local_meta(os.path.join(ld, name)), synced), name, r_stat.st_size)
+            return plan
+        plan["remote"], plan["local"] = rp, os.path.join(ld, posixpath.basename(rp.rstrip('/')))
+        stack = [""]
+        while stack and self.is_running:
+            rel = stack.pop()
+            l = os.path.join(plan["local"], *rel.split("/")) if rel else plan["local"]
+            local_entries = {}
+            if os.path.isdir(l):
+                with os.scandir(l) as it:
+                    for e in it: local_entries[e.name] = e
+            else: plan["dirs"].append(rel)
+            for e in sorted(sftp.listdir_attr(posixpath.join(plan["remote"], rel) if rel else plan["remote"]), key=lambda x: x.filename):
+                frel = posixpath.join(rel, e.filename)
+                le = local_entries.get(e.filename)
+                if stat.S_ISDIR(e.st_mode):
+                    if le is not None and not le.is_dir(): self._plan_item(plan, "conflict", frel, 0)
+                    else: stack.append(frel)
+                elif le is not None and le.is_dir(): self._plan_item(plan, "conflict", frel, e.st_size)
+                else:
+                    other = None
+                    if le is not None:
+                        st = le.stat()
+                        other = (st.st_size, st.st_mtime)
+                    self._plan_item(plan, self._classify(e.st_size, e.st_mtime, other, synced), frel, e.st_size, other and other[0])
+        return plan
+
+    def _local_meta(self, path):
+        try: 
+            st = os.stat(path)
+            return (st.st_size, st.st_mtime)
+        except: return None
+
+    def _measure_link(self, sftp, remote_dir):
+        # 写入并读回一个临时文件测量 RTT 与吞吐量, 用于估算 ETA
+        probe = posixpath.join(remote_dir or ".", f".sftp_probe_{os.getpid()}.tmp")
+        data = os.urandom(PLAN_PROBE_BYTES)
+        t0 = time.time()
+        sftp.stat(remote_dir or ".")
+        rtt = time.time() - t0
+        try:
+            t0 = time.time()
+            with sftp.open(probe, "wb") as f:
+                f.set_pipelined(True)
+                f.write(data)
+            up = PLAN_PROBE_BYTES / max(time.time() - t0, 1e-3)
+            t0 = time.time()
+            with sftp.open(probe, "rb") as f:
+                f.prefetch(PLAN_PROBE_BYTES)
+                f.read()
+            down = PLAN_PROBE_BYTES / max(time.time() - t0, 1e-3)
+        finally:
+            try: sftp.remove(probe)
+            except: pass
+        return {"rtt": rtt, "up": up, "down": down}
+
+    def _estimate_plan(self, sftp, plan):
+        probe_dir = self.up_remote_path.get() if plan["action"] == "upload" else posixpath.dirname(plan["remote"].rstrip("/"))
+        try: link = self._measure_link(sftp, probe_dir)
+        except Exception as e:
+            self.log(f"Link probe failed ({e}), ETA unavailable.", "WARN")
+            link = None
+        plan["link"] = link
+        plan["eta_sec"] = None
+        if link:
+            n = sum(1 for it in plan["items"] if it["op"] in ("new", "changed"))
+            bps = link["up"] if plan["action"] == "upload" else link["down"]
+            # 字节耗时 + 每个文件 open/close 的往返开销
+            plan["eta_sec"] = plan["bytes"] / bps + n * 2 * link["rtt"]
+
+    def _fmt_eta(self, sec):
+        if sec is None: return "N/A"
+        return str(datetime.timedelta(seconds=int(sec)))
+
+    def _show_plan(self, plan, counts):
+        win = tk.Toplevel(self.root)
+        win.title(f"传输计划 ({plan['action']})")
+        win.configure(bg=COLORS["bg"])
+        win.geometry("700x500")
+        summary = (f"新增 {counts['new']} | 变更 {counts['changed']} | 跳过 {counts['skip']} | 冲突 {counts['conflict']} | "
+                   f"待传 {plan['bytes'] / 1048576:.2f} MB | 预计耗时 {self._fmt_eta(plan['eta_sec'])}")
+        tk.Label(win, text=summary, bg=COLORS["bg"], fg=COLORS["accent"], font=FONTS["bold"], wraplength=660, justify="left").pack(fill="x", padx=10, pady=10)
+        tree = ttk.Treeview(win, columns=("op", "size", "path"), show="headings")
+        for col, title, width in (("op", "操作", 80), ("size", "大小", 100), ("path", "路径", 480)):
+            tree.heading(col, text=title)
+            tree.column(col, width=width, anchor="w")
+        tree.pack(fill="both", expand=True, padx=10)
+        for it in plan["items"][:PLAN_VIEW_LIMIT]:
+            tree.insert("", tk.END, values=(it["op"], f"{it['size'] / 1024:.1f} KB", it["rel"]))
+        if len(plan["items"]) > PLAN_VIEW_LIMIT:
+            tk.Label(win, text=f"(仅显示前 {PLAN_VIEW_LIMIT} 条，完整列表请导出 JSON)", bg=COLORS["bg"], fg=COLORS["text_dim"]).pack()
+        btns = tk.Frame(win, bg=COLORS["bg"])
+        btns.pack(pady=10)
+        def run():
+            win.destroy()
+            self.start_thread(plan)
+        tk.Button(btns, text="导出 JSON", command=lambda: self._export_plan(plan), bg=COLORS["save"], fg="black", bd=0, padx=10).pack(side="left", padx=5)
+        tk.Button(btns, text="▶ 执行此计划", command=run, bg=COLORS["accent"], fg="black", bd=0, padx=10).pack(side="left", padx=5)
+        tk.Button(btns, text="关闭", command=win.destroy, bg=COLORS["input_bg"], fg="white", bd=0, padx=10).pack(side="left", padx=5)
+
+    def _export_plan(self, plan):
+        path = filedialog.asksaveasfilename(defaultextension=".json", initialfile="transfer_plan.json", filetypes=[("JSON", "*.json")])
+        if not path: return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(plan, f, ensure_ascii=False, indent=2)
+            self.log(f"Plan exported: {path}", "SUCCESS")
+        except Exception as e:
+            self.log(f"Export failed: {e}", "ERROR")
+
+    def _execute_plan(self, sftp, plan):
+        # 按计划原样执行: 只创建计划中的目录、只传输新增/变更文件, 冲突项保持不动
+        local, remote = plan["local"], plan["remote"]
+        self.log(f"Executing approved plan ({plan['created']})...", "INFO")
+        for rel in sorted(plan["dirs"]):
+            if not self.is_running: return
+            if plan["action"] == "upload":
+                try: sftp.mkdir(posixpath.join(remote, rel) if rel else remote)
+                except: pass
+            else:
+                os.makedirs(os.path.join(local, *rel.split("/")) if rel else local, exist_ok=True)
+        for it in plan["items"]:
+            if not self.is_running: return
+            if it["op"] == "conflict": 
+                self.log(f"Conflict (kept): {it['rel']}", "WARN")
+                continue
+            if it["op"] == "skip": continue
+            l = os.path.join(local, *it["rel"].split("/"))
+            r = posixpath.join(remote, it["rel"])
+            if plan["action"] == "upload": self.upload_f(sftp, l, r, check_remote=False)
+            else: self.download_f(sftp, r, l, it["size"], check_local=False)
+
+    # --- 监听模式 (Watch & Sync) ---
+    def _make_watcher(self, local):
+        if sys.platform.startswith("linux"):
+            try: return InotifyWatcher(local)
+            except Exception as e: self.log(f"inotify unavailable ({e}), fallback to polling.", "WARN")
+        return PollWatcher(self, local)
+
+    def do_watch(self, sftp, watcher=None):
+        lp = self.up_local_path.get()
+        if self.upload_mode.get() != "folder":
+            return self.log("监听模式仅支持文件夹上传", "WARN")
+        rp = posixpath.join(self.up_remote_path.get(), os.path.basename(os.path.normpath(lp)))
+        watcher = watcher or self._make_watcher(lp)
+        self.log(f"Watching {lp} ({type(watcher).__name__}), 点击 [中止任务] 结束监听。", "SUCCESS")
+        try:
+            while self.is_running:
+                batch = watcher.poll(WATCH_POLL_INTERVAL)
+                if batch is not None and not batch: continue
+                # 去抖: 变更静默 WATCH_DEBOUNCE 秒或累积满 WATCH_MAX_DELAY 秒后推送一批
+                deadline = time.time() + WATCH_MAX_DELAY
+                while batch is not None and self.is_running and time.time() < deadline:
+                    more = watcher.poll(WATCH_DEBOUNCE)
+                    if more is None: batch = None
+                    elif not more: break
+                    else: batch |= more
+                if not self.is_running: break
+                if batch is None:
+                    self.log("Watch event queue overflow, resyncing tree...", "WARN")
+                    self.upload_r(sftp, lp, rp)
+                else:
+                    self._apply_watch_batch(sftp, lp, rp, batch)
+        finally:
+            watcher.close()
+            self.log("Watch stopped.", "WARN")
+
+    def _apply_watch_batch(self, sftp, local, remote, paths):
+        if not os.path.isdir(local): 
+            return self.log("本地目录不可用, 忽略本批变更", "WARN")
+        self.completed_size = 0
+        self.total_task_size = sum(self._get_recursive_local_size(os.path.join(local, *rel.split("/"))) for rel in paths) or 100
+        self.root.after(0, lambda: self.progress_bar.configure(maximum=self.total_task_size, value=0))
+        handled = []  # 已整体上传/删除的目录, 其下路径不再单独处理
+        for rel in sorted(paths):
+            if not self.is_running: return
+            if not rel or any(rel.startswith(d + "/") for d in handled): continue
+            l = os.path.join(local, *rel.split("/"))
+            r = posixpath.join(remote, rel)
+            if os.path.isdir(l):
+                handled.append(rel)
+                self.upload_r(sftp, l, r)
+            elif os.path.exists(l): 
+                self.upload_f(sftp, l, r, check_remote=False)
+            else:
+                handled.append(rel)
+                self._remote_remove(sftp, r)
+        self.log(f"Watch: synced {len(paths)} change(s).", "INFO")
+
+    def _remote_remove(self, sftp, path):
+        try: attr = sftp.lstat(path)
+        except: return
+        try:
+            if stat.S_ISDIR(attr.st_mode):
+                for entry in sftp.listdir_attr(path): self._remote_remove(sftp, posixpath.join(path, entry.filename))
+                sftp.rmdir(path)
+            else: 
+                sftp.remove(path)
+            self.log(f"Deleted: {path}", "WARN")
+        except Exception as e: 
+            self.log(f"Delete failed: {path} ({e})", "ERROR")
+
+    # --- 多目标分发 (Fan-out) ---
+    def _open_fanout_targets(self, labels):
+        targets, jump_cache = [], {}
+        for label in labels:
+            # SFTPClient 不能跨线程共用: 写入由该目标的工作线程独占, 目录列表另开一个通道
+            try: 
+                sftp = self._open_profile_session(label, jump_cache)
+                list_sftp = self.profile_sessions[-1][0].open_sftp()
+            except Exception as e:
+                self.log(f"[{label}] Connection Failed: {e}", "ERROR")
+                continue
+            targets.append({"label": label, "sftp": sftp, "list_sftp": list_sftp, "q": queue.Queue(maxsize=FANOUT_QUEUE_SLOTS),
+                            "failed": None, "bytes": 0, "ok": 0, "skip": 0})
+        if not targets: raise Exception("所有目标均连接失败")
+        return targets
+
+    def _fanout_worker(self, tgt):
+        # 每个目标独立线程按顺序执行队列中的指令; 出错后只标记失败并继续排空队列, 不影响其它目标
+        sftp, f, fname = tgt["sftp"], None, ""
+        while True:
+            msg = tgt["q"].get()
+            kind = msg[0]
+            if kind == "stop": break
+            try:
+                # 已失败或已停止时只排空队列, 不再写入
+                if tgt["failed"] or (kind == "data" and not self.is_running): continue
+                if kind == "mkdir":
+                    try: sftp.stat(msg[1])
+                    except: 
+                        try: sftp.mkdir(msg[1])
+                        except: 
+                            try: sftp.mkdir(posixpath.dirname(msg[1]))
+                            except: pass
+                            sftp.mkdir(msg[1])
+                elif kind == "open":
+                    fname = posixpath.basename(msg[1])
+                    f = sftp.open(msg[1], "wb")
+                    f.set_pipelined(True)
+                elif kind == "data":
+                    f.write(msg[1])
+                    tgt["bytes"] += len(msg[1])
+                elif kind == "close":
+                    f.close()
+                    f = None
+                    tgt["ok"] += 1
+                elif kind == "abort" and f:
+                    f.close()
+                    f = None
+            except Exception as e:
+                tgt["failed"] = str(e)
+                self.log(f"[{tgt['label']}] Fail: {fname} ({e}), 该目标已停止", "ERROR")
+                try: 
+                    if f: f.close()
+                except: pass
+                f = None
+
+    def do_fanout(self, targets):
+        lp = self.up_local_path.get()
+        rb = self.up_remote_path.get()
+        self.log(f"Start Fan-out to {len(targets)} target(s)...", "INFO")
+        workers = [threading.Thread(target=self._fanout_worker, args=(t,), daemon=True) for t in targets]
+        for w in workers: w.start()
+        self.root.after(0, self._fanout_tick)
+        try:
+            if self.upload_mode.get() == "folder":
+                self._fanout_r(targets, lp, posixpath.join(rb, os.path.basename(os.path.normpath(lp))))
+            else:
+                self._fanout_f(targets, lp, posixpath.join(rb, os.path.basename(lp)))
+        finally:
+            for t in targets:
+                for msg in (("abort",), ("stop",)):
+                    try: t["q"].put(msg, timeout=1 if t["failed"] else FANOUT_STALL_TIMEOUT)
+                    except queue.Full: t["failed"] = t["failed"] or f"目标无响应超过 {FANOUT_STALL_TIMEOUT}s"
+            for t, w in zip(targets, workers):
+                w.join(FANOUT_STALL_TIMEOUT)
+                if w.is_alive() and not t["failed"]: t["failed"] = f"目标无响应超过 {FANOUT_STALL_TIMEOUT}s"
+            for t in targets:
+                if t["failed"]: self.log(f"[{t['label']}] FAILED: {t['failed']}", "ERROR")
+                else: self.log(f"[{t['label']}] OK: {t['ok']} uploaded, {t['skip']} skipped, {t['bytes'] / 1048576:.1f} MB", "SUCCESS")
+        failed = sum(1 for t in targets if t["failed"])
+        if failed and self.is_running: raise Exception(f"{failed}/{len(targets)} 个分发目标失败")
+
+    def _fanout_put(self, t, msg):
+        # 队列持续满 FANOUT_STALL_TIMEOUT 秒 (目标卡住但未报错) 即标记失败, 之后不再等待该目标
+        deadline = time.time() + FANOUT_STALL_TIMEOUT
+        while not t["failed"]:
+            try: return t["q"].put(msg, timeout=0.5)
+            except queue.Full:
+                if time.time() > deadline:
+                    t["failed"] = f"目标无响应超过 {FANOUT_STALL_TIMEOUT}s"
+                    self.log(f"[{t['label']}] Stalled, 该目标已停止", "ERROR")
+
+    def _fanout_listing(self, targets, remote):
+        # 每个目录对各目标并行 listdir_attr 一次, 返回 {label: {文件名: 大小}} 供智能跳过;
+        # 只等待一次目录列表, 不等待目标排空已排队的数据; 超时未返回的目标标记失败
+        active = [t for t in targets if not t["failed"]]
+        listings = {}
+        def run(t):
+            try: listings[t["label"]] = {a.filename: a.st_size for a in t["list_sftp"].listdir_attr(remote)}
+            except: listings[t["label"]] = {}
+        threads = [threading.Thread(target=run, args=(t,), daemon=True) for t in active]
+        for th in threads: th.start()
+        deadline = time.time() + FANOUT_STALL_TIMEOUT
+        for t, th in zip(active, threads):
+            th.join(max(0, deadline - time.time()))
+            if th.is_alive():
+                t["failed"] = f"目录列表超过 {FANOUT_STALL_TIMEOUT}s 未返回"
+                self.log(f"[{t['label']}] Stalled, 该目标已停止", "ERROR")
+        return listings
+
+    def _fanout_alive(self, targets):
+        if all(t["failed"] for t in targets): raise Exception("所有分发目标均已失败")
+
+    def _fanout_r(self, targets, local, remote):
+        if not self.is_running: return
+        self._fanout_alive(targets)
+        for t in targets: self._fanout_put(t, ("mkdir", remote))
+        items = os.listdir(local)
+        listings = {} if self.force_overwrite.get() else self._fanout_listing(targets, remote)
+        for item in items:
+            if not self.is_running: return
+            l = os.path.join(local, item)
+            r = posixpath.join(remote, item)
+            if os.path.isdir(l): self._fanout_r(targets, l, r)
+            else: self._fanout_f(targets, l, r, listings)
+
+    def _fanout_f(self, targets, local, remote, listings=None):
+        if not self.is_running: return
+        self._fanout_alive(targets)
+        fname = os.path.basename(local)
+        size = os.path.getsize(local)
+        # 按目录列表判断各目标是否需要传输 (智能跳过), 单文件模式时现取所在目录
+        if listings is None: listings = {} if self.force_overwrite.get() else self._fanout_listing(targets, posixpath.dirname(remote))
+        needy = []
+        for t in targets:
+            if t["failed"]: continue
+            if listings.get(t["label"], {}).get(fname) != size: needy.append(t)
+            else: 
+                t["skip"] += 1
+                t["bytes"] += size
+        self._fanout_alive(targets)
+        if not needy:
+            self.log(f"Skip: {fname}", "INFO")
+            return
+        self.log(f"Fan-out: {fname} -> {len(needy)} target(s)", "CMD")
+        for t in needy: self._fanout_put(t, ("open", remote))
+        try:
+            with open(local, "rb") as f:
+                while self.is_running:
+                    buf = f.read(FANOUT_CHUNK)
+                    if not buf: break
+                    # 同一缓冲对象放入各目标队列; 队列满时等待, 即最慢目标最多落后一个队列长度
+                    for t in needy: self._fanout_put(t, ("data", buf))
+        except Exception as e:
+            self.log(f"Read failed: {fname} ({e})", "ERROR")
+            for t in needy: self._fanout_put(t, ("abort",))
+            return
+        for t in needy: self._fanout_put(t, ("close",) if self.is_running else ("abort",))
+
+    def _fanout_tick(self):
+        if not self.is_running or not self.fanout_targets: return
+        total = self.total_task_size or 1
+        # 总进度取仍在运行目标中最慢的一个
+        alive = [t["bytes"] for t in self.fanout_targets if not t["failed"]]
+        self.progress_bar["value"] = min(alive) if alive else 0
+        parts = []
+        for t in self.fanout_targets:
+            state = "FAIL" if t["failed"] else f"{min(100.0, t['bytes'] * 100 / total):.0f}%"
+            parts.append(f"{t['label'][:12]}: {state}")
+        self.progress_label.config(text=" | ".join(parts))
+        self.root.after(1000, self._fanout_tick)
+
+    # --- 服务器间中转 (Relay) ---
+    def do_relay(self, src, dst):
+        rp = self.relay_src_path.get()
+        rd = self.relay_dst_path.get()
+        self.log("Start Relaying...", "INFO")
+        
+        try: r_stat = src.stat(rp)
+        except: raise Exception("源远程路径不存在")
+        
+        target = posixpath.join(rd, posixpath.basename(rp.rstrip('/')))
+        if stat.S_ISDIR(r_stat.st_mode): self.relay_r(src, dst, rp, target)
+        else: self.relay_f(src, dst, rp, target, r_stat.st_size)
+
+    def relay_r(self, src, dst, src_dir, dst_dir):
+        if not self.is_running: return
+        try: dst.stat(dst_dir)
+        except: 
+            try: dst.mkdir(dst_dir)
+            except: 
+                try: dst.mkdir(posixpath.dirname(dst_dir))
+                except: pass
+                dst.mkdir(dst_dir)
+        for entry in src.listdir_attr(src_dir):
+            if not self.is_running: return
+            s_path = posixpath.join(src_dir, entry.filename)
+            d_path = posixpath.join(dst_dir, entry.filename)
+            if stat.S_ISDIR(entry.st_mode): self.relay_r(src, dst, s_path, d_path)
+            else: self.relay_f(src, dst, s_path, d_path, entry.st_size)
+
+    def _ring_put(self, ring, item, stop):
+        while not stop.is_set():
+            try: 
+                ring.put(item, timeout=0.5)
+                return
+            except queue.Full: pass
+
+    def relay_f(self, src, dst, src_file, dst_file, size):
+        if not self.is_running: return False
+        fname = posixpath.basename(src_file)
+        
+        if not self.force_overwrite.get():
+            try:
+                if dst.stat(dst_file).st_size == size:
+                    self.log(f"Skip: {fname}", "INFO")
+                    self.root.after(0, lambda: self.update_status(fname, size))
+                    return True
+            except: pass
+        
+        self.log(f"Relaying: {fname}", "CMD")
+        # 读写两端并发: 读线程按块流水线读取源文件放入有界队列, 当前线程写入目标
+        ring = queue.Queue(maxsize=RELAY_RING_SLOTS)
+        stop = threading.Event()
+        
+        def reader():
+            try:
+                with src.open(src_file, "rb") as fr:
+                    off = 0
+                    while off < size and not stop.is_set():
+                        n = min(RELAY_CHUNK, size - off)
+                        self._ring_put(ring, b"".join(fr.readv([(off, n)])), stop)
+                        off += n
+                self._ring_put(ring, b"", stop)
+            except Exception as e: 
+                self._ring_put(ring, e, stop)
+        
+        rt = threading.Thread(target=reader, daemon=True)
+        rt.start()
+        try:
+            with dst.open(dst_file, "wb") as fw:
+                fw.set_pipelined(True)
+                while True:
+                    # 源端读取卡住时也要能响应中止, 与 _ring_put 一样按超时轮询
+                    try: buf = ring.get(timeout=0.5)
+                    except queue.Empty:
+                        if not self.is_running: raise Exception("Stop")
+                        continue
+                    if isinstance(buf, Exception): raise buf
+                    if not buf: break
+                    if not self.is_running: raise Exception("Stop")
+                    fw.write(buf)
+                    self.root.after(0, lambda n=len(buf): self.update_status(fname, n))
+            self.log(f"OK: {fname}", "SUCCESS")
+            return True
+        except Exception as e:
+            if "Stop" not in str(e): self.log(f"Fail: {e}", "ERROR")
+            return False
+        finally:
+            # 等读线程退出 (关闭源文件句柄) 后再返回, 避免下一个文件/列目录与它并发使用同一个 SFTPClient
+            stop.set()
+            rt.join(RELAY_READER_JOIN)
+            if rt.is_alive(): raise Exception("源端读取无响应, 中转已中止")
 
     # --- 终端独立命令 ---
     def run_custom_command(self, event=None):
@@ -876,34 +2529,101 @@ class SFTPUploaderApp:
         self.log(f"remote$ {cmd}", "INPUT")
         
         if self.is_connected and self.ssh_client:
-            threading.Thread(target=self._run_cmd_existing, args=(cmd,), daemon=True).start()
+            threading.Thread(target=self._run_cmd_shell, args=(cmd,), daemon=True).start()
         else:
             self.log("未连接，尝试建立临时连接...", "WARN")
             threading.Thread(target=self._run_cmd_temp, args=(cmd,), daemon=True).start()
 
-    def _run_cmd_existing(self, cmd):
+    def interrupt_command(self):
+        chan = self.shell_chan
+        if chan and not chan.closed:
+            try: 
+                chan.send("\x03")
+                self.log("^C", "WARN")
+            except Exception as e: self.log(f"CMD Error: {e}", "ERROR")
+
+    def _ensure_shell(self):
+        # 在持久会话上复用同一个 shell 通道, 与 SFTP 通道互不影响
+        with self.shell_lock:
+            chan = self.shell_chan
+            if chan and not chan.closed and not chan.exit_status_ready(): return chan
+            chan = self.ssh_client.invoke_shell(term="dumb", width=200, height=50)
+            chan.send("stty -echo 2>/dev/null\n")
+            self.shell_chan = chan
+            threading.Thread(target=self._pump_channel, args=(chan,), daemon=True).start()
+            return chan
+
+    def _run_cmd_shell(self, cmd):
         try:
-            stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-            out = stdout.read().decode().strip()
-            err = stderr.read().decode().strip()
-            if out: self.log(out, "INFO")
-            if err: self.log(err, "ERROR")
-            if not out and not err: self.log("[No Output]", "INFO")
+            self._ensure_shell().send(cmd + "\n")
         except Exception as e:
             self.log(f"CMD Error: {e}", "ERROR")
-            if "Socket" in str(e):
+            if "Socket" in str(e) or "closed" in str(e).lower():
                  self.root.after(0, lambda: self._set_connected_ui(False))
 
+    def _pump_channel(self, chan):
+        # 边读边输出: 增量解码 UTF-8 (多字节字符可能被切断), 按行刷出, 空闲时刷出残余
+        decoders = {"INFO": codecs.getincrementaldecoder("utf-8")(errors="replace"), 
+                    "ERROR": codecs.getincrementaldecoder("utf-8")(errors="replace")}
+        pending = {"INFO": "", "ERROR": ""}
+        last_data = time.time()
+        try:
+            while True:
+                got = False
+                if chan.recv_ready():
+                    pending["INFO"] += decoders["INFO"].decode(chan.recv(SHELL_READ_CHUNK))
+                    got = True
+                if chan.recv_stderr_ready():
+                    pending["ERROR"] += decoders["ERROR"].decode(chan.recv_stderr(SHELL_READ_CHUNK))
+                    got = True
+                now = time.time()
+                if got: last_data = now
+                idle = now - last_data > SHELL_FLUSH_IDLE
+                for level, text in pending.items():
+                    cut = len(text) if (idle or len(text) > SHELL_MAX_PENDING) else text.rfind("\n") + 1
+                    if cut: 
+                        self._emit_output(text[:cut], level)
+                        pending[level] = text[cut:]
+                if not got:
+                    if chan.closed or (chan.exit_status_ready() and not chan.recv_ready() and not chan.recv_stderr_ready()): break
+                    time.sleep(0.05)
+        except Exception as e:
+            self.log(f"CMD Error: {e}", "ERROR")
+        for level, dec in decoders.items():
+            rest = pending[level] + dec.decode(b"", final=True)
+            if rest: self._emit_output(rest, level)
+
+    def _emit_output(self, text, level):
+        # 放入有界队列, 队列满时阻塞读取线程 (不再 recv), 远程命令随 SSH 窗口耗尽而暂停, 内存占用有上限
+        text = ANSI_RE.sub("", text).replace("\r", "")
+        if text: self.term_queue.put((text, level))
+
+    def _drain_term(self):
+        # 界面线程周期性取出一批输出, 相邻同级别的文本合并后一次插入
+        batch = []
+        try:
+            for _ in range(TERM_DRAIN_BATCH):
+                text, level = self.term_queue.get_nowait()
+                if batch and batch[-1][1] == level: batch[-1][0] += text
+                else: batch.append([text, level])
+        except queue.Empty: pass
+        for text, level in batch: self._term_append(text, level)
+        self.root.after(TERM_DRAIN_MS, self._drain_term)
+
+    def _term_append(self, text, level):
+        self.term.insert(tk.END, text, level)
+        lines = int(self.term.index("end-1c").split(".")[0])
+        if lines > TERM_MAX_LINES: self.term.delete("1.0", f"{lines - TERM_MAX_LINES}.0")
+        self.term.see(tk.END)
+
     def _run_cmd_temp(self, cmd):
         c = None
         j = None
         try:
             c, j = self._get_ssh_connection()
-            stdin, stdout, stderr = c.exec_command(cmd)
-            out = stdout.read().decode().strip()
-            err = stderr.read().decode().strip()
-            if out: self.log(out, "INFO")
-            if err: self.log(err, "ERROR")
+            chan = c.get_transport().open_session()
+            chan.exec_command(cmd)
+            self._pump_channel(chan)
         except Exception as e: self.log(f"CMD Error: {e}", "ERROR")
         finally:
             if c: c.close()
@@ -0,0 +1,51 @@
+import importlib.util
+import os
+import tempfile
+import types
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+spec = importlib.util.spec_from_file_location("uploader", os.path.join(HERE, "..", "main_upload_fileV3.7.py"))
+uploader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(uploader)
+
+
+def scan(root, prev=None):
+    app = types.SimpleNamespace(is_running=True)
+    return uploader.SFTPUploaderApp._scan_local_manifest(app, root, prev)
+
+
+class ScanLocalManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.mkdir(os.path.join(self.root, "a"))
+        with open(os.path.join(self.root, "a", "x"), "w") as f: f.write("hello")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_unchanged_tree_reports_nothing(self):
+        dirs = scan(self.root)[0]
+        _, new_dirs, changed = scan(self.root, dirs)
+        self.assertEqual(new_dirs, [])
+        self.assertEqual(changed, [])
+
+    def test_in_place_edit_is_detected(self):
+        dirs = scan(self.root)[0]
+        d = os.path.join(self.root, "a")
+        st = os.stat(d)
+        with open(os.path.join(d, "x"), "w") as f: f.write("hello world")
+        os.utime(d, ns=(st.st_atime_ns, st.st_mtime_ns))  # 目录 mtime 保持不变
+        _, _, changed = scan(self.root, dirs)
+        self.assertEqual(changed, [("a/x", 11)])
+
+    def test_added_file_is_detected(self):
+        dirs = scan(self.root)[0]
+        with open(os.path.join(self.root, "a", "y"), "w") as f: f.write("new")
+        _, _, changed = scan(self.root, dirs)
+        self.assertEqual(changed, [("a/y", 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()